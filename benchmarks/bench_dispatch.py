@@ -0,0 +1,323 @@
+"""
+bench_dispatch.py
+Measure the dispatch pipeline with synthetic recipes
+----------------------------------------------------
+
+Every scenario is a recipe where a source action sends timestamped
+messages to one or more sink actions, through:
+- fanout: the source straight to N sinks
+- chain:  a chain of N relay actions
+- filter: N filter actions, each with a list of regexes
+- tail:   a file appended by the source and followed by a tail action
+
+Each scenario runs in its own process, through FlowsManager, and reports
+messages per second, p50/p99 end to end latency, CPU time and max RSS.
+The sinks must run in that process, so the -W option of flows is refused.
+
+Usage: python benchmarks/bench_dispatch.py [-n MESSAGES] [-s SCENARIO ...]
+           [-w WIDTH] [-r RATE] [-a "FLOWS ARGS"] [-j FILE]
+
+Copyright 2016 Davide Mastromatteo
+License: Apache-2.0
+"""
+
+import argparse
+import json
+import os
+import resource
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flows.Actions.Action import Action  # noqa: E402
+
+SCENARIOS = ("fanout", "chain", "filter", "tail")
+RESULT_PREFIX = "BENCH RESULT "
+
+
+class BenchResults:
+    """
+    Latencies collected by the sinks of the running scenario
+    """
+
+    lock = threading.Lock()
+    done = threading.Event()
+    expected = 0
+    first_sent = None
+    last_received = None
+    latencies = []
+
+
+class BenchSourceAction(Action):
+    """
+    Send [messages] messages, [rate] per second or all at once,
+    to the output file if specified or to the subscribed actions.
+    Each message is tagged with its index modulo [tags]
+    """
+
+    type = "bench_source"
+
+    def on_init(self):
+        super().on_init()
+        self.messages = int(self.configuration["messages"])
+        self.rate = float(self.configuration.get("rate", "0"))
+        self.output = self.configuration.get("output")
+        self.tags = int(self.configuration.get("tags", "1"))
+        self.sent = 0
+
+    def on_cycle(self):
+        if self.sent >= self.messages:
+            return
+
+        if BenchResults.first_sent is None:
+            BenchResults.first_sent = time.perf_counter()
+
+        count = self.messages - self.sent
+        if self.rate > 0:
+            count = min(count, max(1, int(self.rate * self.cycle_interval)))
+
+        if self.output is None:
+            for index in range(self.sent, self.sent + count):
+                self.send_message(self.new_message(index))
+        else:
+            with open(self.output, "a") as output_file:
+                for index in range(self.sent, self.sent + count):
+                    output_file.write(self.new_message(index) + "\n")
+
+        self.sent = self.sent + count
+
+    def new_message(self, index):
+        return f"{time.perf_counter()!r} tag{index % self.tags} payload"
+
+
+class BenchRelayAction(Action):
+    """
+    Forward the inputs unchanged
+    """
+
+    type = "bench_relay"
+
+    def on_input_received(self, action_input=None):
+        self.send_message(action_input.message)
+
+
+class BenchSinkAction(Action):
+    """
+    Record the latency of the inputs, from the time they were sent
+    by the source
+    """
+
+    type = "bench_sink"
+
+    def on_input_received(self, action_input=None):
+        now = time.perf_counter()
+        latency = now - float(action_input.message.split(" ", 1)[0])
+
+        with BenchResults.lock:
+            BenchResults.latencies.append(latency)
+            BenchResults.last_received = now
+            if len(BenchResults.latencies) >= BenchResults.expected:
+                BenchResults.done.set()
+
+
+def build_recipe(scenario, messages, width, rate, directory):
+    """
+    Return the recipe of a scenario and the number of messages
+    the sinks are expected to receive
+    """
+    source = (
+        f"[source]\ntype = bench_source\nmessages = {messages}\n"
+        f"rate = {rate}\ntags = {width}\ncycle_interval = 10\n"
+    )
+
+    if scenario == "fanout":
+        sinks = "".join(
+            f"\n[sink{i}]\ntype = bench_sink\ninput = source\n" for i in range(width)
+        )
+        return source + sinks, messages * width
+
+    if scenario == "chain":
+        relays = "".join(
+            f"\n[relay{i}]\ntype = bench_relay\ninput = relay{i - 1}\n"
+            for i in range(1, width)
+        )
+        return (
+            source
+            + "\n[relay0]\ntype = bench_relay\ninput = source\n"
+            + relays
+            + f"\n[sink]\ntype = bench_sink\ninput = relay{width - 1}\n",
+            messages,
+        )
+
+    if scenario == "filter":
+        # every filter has a list of regexes that don't match and one that
+        # matches the messages tagged for it, so each message passes once
+        filters = ""
+        for i in range(width):
+            regexes_file = os.path.join(directory, f"regexes{i}.txt")
+            with open(regexes_file, "w") as f:
+                f.writelines(f"^never{j} .* (ERROR|WARN)[0-9]+$\n" for j in range(50))
+            filters = filters + (
+                f"\n[filter{i}]\ntype = filter\ninput = source\n"
+                f"regexes_file = {regexes_file}\nregex = \\btag{i}\\b\n"
+            )
+        sink_inputs = ", ".join(f"filter{i}" for i in range(width))
+        return (
+            source + filters + f"\n[sink]\ntype = bench_sink\ninput = {sink_inputs}\n",
+            messages,
+        )
+
+    if scenario == "tail":
+        tailed_file = os.path.join(directory, "tailed.log")
+        open(tailed_file, "w").close()
+        return (
+            source
+            + f"output = {tailed_file}\n"
+            + f"\n[tail]\ntype = tail\ninput = {tailed_file}\ncycle_interval = 1\n"
+            + "\n[sink]\ntype = bench_sink\ninput = tail\n",
+            messages,
+        )
+
+    raise ValueError(f"unknown scenario {scenario}")
+
+
+def percentile(values, percent):
+    if len(values) == 0:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def run_scenario(args):
+    """
+    Run a scenario in this process and print its results
+    """
+    from flows.FlowsManager import FlowsManager
+
+    with tempfile.TemporaryDirectory() as directory:
+        recipe, BenchResults.expected = build_recipe(
+            args.SCENARIO[0], args.MESSAGES, args.WIDTH, args.RATE, directory
+        )
+        recipe_file = os.path.join(directory, "bench.recipe")
+        with open(recipe_file, "w") as f:
+            f.write(recipe)
+
+        sys.argv = ["flows", recipe_file] + shlex.split(args.FLOWSARGS)
+        flows_manager = FlowsManager()
+
+        def stop_when_done():
+            BenchResults.done.wait(args.TIMEOUT)
+            flows_manager.stop()
+
+        cpu_start = time.process_time()
+        threading.Thread(target=stop_when_done, daemon=True).start()
+        flows_manager.start()
+        cpu_time = time.process_time() - cpu_start
+
+    latencies = sorted(BenchResults.latencies)
+    elapsed = (BenchResults.last_received or 0) - (BenchResults.first_sent or 0)
+    result = {
+        "scenario": args.SCENARIO[0],
+        "expected": BenchResults.expected,
+        "received": len(latencies),
+        "messages_per_second": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "cpu_seconds": cpu_time,
+        # kilobytes on linux, bytes on macos
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        / (1024 * 1024 if sys.platform == "darwin" else 1024),
+    }
+    print(RESULT_PREFIX + json.dumps(result), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="dispatch pipeline benchmark")
+    parser.add_argument("-n", "--MESSAGES", type=int, default=10000)
+    parser.add_argument(
+        "-s", "--SCENARIO", nargs="+", choices=SCENARIOS, default=SCENARIOS
+    )
+    parser.add_argument(
+        "-w",
+        "--WIDTH",
+        type=int,
+        default=10,
+        help="sinks, relays or filters per scenario",
+    )
+    parser.add_argument(
+        "-r",
+        "--RATE",
+        type=float,
+        default=0,
+        help="messages per second, 0 = all at once",
+    )
+    parser.add_argument(
+        "-a", "--FLOWSARGS", default="-e -b 0", help="command line arguments of flows"
+    )
+    parser.add_argument("-t", "--TIMEOUT", type=float, default=120)
+    parser.add_argument("-j", "--JSON", help="write the results to a json file")
+    parser.add_argument("--CHILD", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    flows_args = shlex.split(args.FLOWSARGS)
+    if any(
+        x in ("-W", "--WORKERS") or x.startswith(("-W", "--WORKERS="))
+        for x in flows_args
+    ):
+        parser.error(
+            "the -W option of flows is not supported: the sinks would run in the workers"
+        )
+
+    if args.CHILD:
+        run_scenario(args)
+        return
+
+    print(
+        f"{'scenario':<10}{'received':>12}{'msg/s':>12}{'p50 ms':>10}"
+        f"{'p99 ms':>10}{'cpu s':>8}{'rss MB':>8}"
+    )
+    results = []
+    for scenario in args.SCENARIO:
+        # a fresh process for every scenario: flows is made of singletons
+        child = subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--CHILD",
+                f"--SCENARIO={scenario}",
+                f"--MESSAGES={args.MESSAGES}",
+                f"--WIDTH={args.WIDTH}",
+                f"--RATE={args.RATE}",
+                f"--FLOWSARGS={args.FLOWSARGS}",
+                f"--TIMEOUT={args.TIMEOUT}",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+
+        lines = [x for x in child.stdout.splitlines() if x.startswith(RESULT_PREFIX)]
+        if len(lines) == 0:
+            print(f"{scenario:<10}failed, exit code {child.returncode}")
+            continue
+
+        result = json.loads(lines[-1][len(RESULT_PREFIX) :])
+        results.append(result)
+        print(
+            f"{scenario:<10}{result['received']:>6}/{result['expected']:<5}"
+            f"{result['messages_per_second']:>12.0f}{result['p50_ms']:>10.2f}"
+            f"{result['p99_ms']:>10.2f}{result['cpu_seconds']:>8.2f}"
+            f"{result['max_rss_mb']:>8.1f}"
+        )
+
+    if args.JSON:
+        with open(args.JSON, "w") as f:
+            json.dump({"flows_args": args.FLOWSARGS, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+bench_wire_format.py
+Compare the wire formats available to the zmq transport
+-------------------------------------------------------
+
+Usage: python benchmarks/bench_wire_format.py [-n ITERATIONS]
+
+Copyright 2016 Davide Mastromatteo
+License: Apache-2.0
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flows.Actions.Action import ActionInput  # noqa: E402
+from flows.WireFormat import FileSystemEvent, WireFormat  # noqa: E402
+
+
+def sample_messages():
+    """
+    Return the messages to be encoded: a plain text message and a message
+    carrying a file system event, like the ones sent by the watchdog action
+    """
+    text = ActionInput(None, "2017-01-01 12:00:00 ERROR something went wrong", "tail")
+    event = ActionInput(
+        FileSystemEvent(
+            "moved", "/var/spool/in/file.txt", "/var/spool/out/file.txt", False
+        ),
+        "",
+        "watchdog",
+    )
+    return {"text": text, "event": event}
+
+
+def bench(wire_format, message, iterations):
+    """
+    Return (frame size, encode microseconds, decode microseconds)
+    """
+    frame = wire_format.encode(message)
+    encode_time = timeit.timeit(lambda: wire_format.encode(message), number=iterations)
+    decode_time = timeit.timeit(lambda: wire_format.decode(frame), number=iterations)
+    return (
+        len(frame),
+        encode_time / iterations * 1000000,
+        decode_time / iterations * 1000000,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="wire format benchmark")
+    parser.add_argument("-n", "--ITERATIONS", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(
+        f"{'format':<10}{'message':<10}{'bytes':>8}{'encode us':>12}{'decode us':>12}"
+    )
+    for wire_format_name in ("pickle", "compact", "msgpack"):
+        try:
+            wire_format = WireFormat.create_wire_format(wire_format_name)
+        except ValueError as err:
+            print(f"{wire_format_name:<10}skipped: {err}")
+            continue
+
+        for message_name, message in sample_messages().items():
+            size, encode_us, decode_us = bench(wire_format, message, args.ITERATIONS)
+            print(
+                f"{wire_format_name:<10}{message_name:<10}{size:>8}"
+                f"{encode_us:>12.2f}{decode_us:>12.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
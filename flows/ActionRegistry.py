@@ -0,0 +1,280 @@
+"""
+ActionRegistry.py
+Find the class implementing an action type
+------------------------------------------
+
+The action types are looked up, in order:
+- among the actions already imported
+- in the manifest of the built-in actions
+- among the entry points of the "flows.actions" group, named after the type
+- in an index mapping each type to its action file. The index is built
+  parsing the files found by Action.search_actions, without importing them,
+  and it's cached on disk: a file is parsed again only when its mtime changes
+
+Copyright 2016 Davide Mastromatteo
+License: Apache-2.0
+"""
+
+import ast
+import importlib
+import importlib.metadata
+import json
+import os
+import threading
+import time
+
+from flows.Actions import BUILTIN_ACTIONS
+from flows.ConfigManager import ConfigManager
+from flows.FlowsLogger import FlowsLogger
+
+ACTION_INDEX_VERSION = 1
+
+
+class ActionRegistry:
+    """
+    ActionRegistry class
+    Map the action types to the action classes
+    """
+
+    entry_point_group = "flows.actions"
+
+    # singleton variables
+    _instance = None
+    _instance_lock = threading.Lock()
+    LOGGER = FlowsLogger.default_instance().get_logger()
+    CONFIG_MANAGER = ConfigManager.default_instance()
+
+    @classmethod
+    def default_instance(cls):
+        """
+        For use like a singleton, return the existing instance of the object
+        or a new instance
+        """
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = ActionRegistry()
+
+        return cls._instance
+
+    def __init__(self):
+        super().__init__()
+
+        self.entry_points = None
+        self.index = None
+        self.index_is_fresh = False
+        self.imported_files = set()
+        self.import_times = {}
+
+    def find_action_class(self, action_code):
+        """
+        Return the class of the action type action_code, or None
+        """
+        action_class = self._find_imported_class(action_code)
+        if action_class is not None:
+            return action_class
+
+        if action_code in BUILTIN_ACTIONS:
+            self._import_module(BUILTIN_ACTIONS[action_code])
+            return self._find_imported_class(action_code)
+
+        action_class = self._find_entry_point_class(action_code)
+        if action_class is not None:
+            return action_class
+
+        filename = self._find_indexed_file(action_code)
+        if filename is None and not self.index_is_fresh:
+            # a new action file may have been installed, look for it
+            self._build_index()
+            filename = self._find_indexed_file(action_code)
+
+        if filename is None:
+            return None
+
+        self._import_file(filename)
+        return self._find_imported_class(action_code)
+
+    @staticmethod
+    def _find_imported_class(action_code):
+        """
+        Look for the action type among the subclasses of Action
+        """
+        # imported here, the actions module imports the registry
+        from flows.Actions.Action import Action
+
+        subclasses = Action.__subclasses__()
+        while subclasses:
+            subclass = subclasses.pop(0)
+            if subclass.type == action_code:
+                return subclass
+            subclasses.extend(subclass.__subclasses__())
+
+        return None
+
+    def _find_entry_point_class(self, action_code):
+        """
+        Look for the action type among the installed entry points
+        """
+        if self.entry_points is None:
+            installed_entry_points = importlib.metadata.entry_points()
+            if hasattr(installed_entry_points, "select"):
+                group = installed_entry_points.select(group=self.entry_point_group)
+            else:
+                group = installed_entry_points.get(self.entry_point_group, [])
+
+            self.entry_points = {entry_point.name: entry_point for entry_point in group}
+
+        if action_code not in self.entry_points:
+            return None
+
+        self.LOGGER.debug(f"loading action {action_code} from its entry point")
+        start = time.perf_counter()
+        try:
+            return self.entry_points[action_code].load()
+        except Exception as ex:
+            self.LOGGER.warning(f"{ex}")
+            self.LOGGER.warning(
+                f"an error occured while loading the entry point {action_code}"
+            )
+            return None
+        finally:
+            self.import_times[self.entry_points[action_code].value] = (
+                time.perf_counter() - start
+            )
+
+    def _find_indexed_file(self, action_code):
+        """
+        Return the file defining the action type according to the index
+        """
+        if self.index is None:
+            self.index = self._read_index()
+
+        for filename, entry in self.index.items():
+            if action_code not in entry["types"]:
+                continue
+
+            try:
+                if os.path.getmtime(filename) == entry["mtime"]:
+                    return filename
+            except OSError:
+                pass
+
+            # the file changed or disappeared, so the index is stale
+            return None
+
+        return None
+
+    def _build_index(self):
+        """
+        Scan the action files, parsing the ones changed since the last scan
+        """
+        # imported here, the actions module imports the registry
+        from flows.Actions.Action import Action
+
+        start = time.perf_counter()
+        old_index = self.index or {}
+        self.index = {}
+
+        for filename in Action.search_actions():
+            try:
+                mtime = os.path.getmtime(filename)
+            except OSError:
+                continue
+
+            entry = old_index.get(filename)
+            if entry is None or entry["mtime"] != mtime:
+                entry = {"mtime": mtime, "types": self._parse_action_types(filename)}
+
+            self.index[filename] = entry
+
+        self.index_is_fresh = True
+        self._write_index()
+        self.LOGGER.debug(
+            f"action index built in {time.perf_counter() - start:.3f} seconds"
+        )
+
+    def _parse_action_types(self, filename):
+        """
+        Return the action types defined in a file, without importing it
+        """
+        try:
+            with open(filename, encoding="utf-8") as action_file:
+                tree = ast.parse(action_file.read(), filename)
+        except (OSError, SyntaxError, ValueError) as ex:
+            self.LOGGER.warning(f"can't parse {filename}: {ex}")
+            return []
+
+        types = []
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.ClassDef):
+                continue
+
+            for statement in node.body:
+                if (
+                    isinstance(statement, ast.Assign)
+                    and any(
+                        isinstance(target, ast.Name) and target.id == "type"
+                        for target in statement.targets
+                    )
+                    and isinstance(statement.value, ast.Constant)
+                    and isinstance(statement.value.value, str)
+                ):
+                    types.append(statement.value.value)
+
+        return types
+
+    def _import_file(self, filename):
+        """
+        Import an action file, at most once
+        """
+        # imported here, the actions module imports the registry
+        from flows.Actions.Action import Action
+
+        if filename in self.imported_files:
+            return
+
+        self.imported_files.add(filename)
+        module_name = os.path.basename(os.path.normpath(filename))[:-3]
+        start = time.perf_counter()
+        Action.load_module(module_name, filename)
+        self.import_times[filename] = time.perf_counter() - start
+
+    def _import_module(self, module_name):
+        """
+        Import the module of a built-in action
+        """
+        if module_name in self.import_times:
+            return
+
+        start = time.perf_counter()
+        try:
+            importlib.import_module(module_name)
+        except Exception as ex:
+            self.LOGGER.error(f"can't import {module_name}: {ex}")
+        self.import_times[module_name] = time.perf_counter() - start
+
+    def _read_index(self):
+        """
+        Read the index cached on disk
+        """
+        try:
+            with open(self.CONFIG_MANAGER.action_index_file, encoding="utf-8") as f:
+                cached_index = json.load(f)
+            if cached_index.get("version") == ACTION_INDEX_VERSION:
+                return cached_index["files"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+        return {}
+
+    def _write_index(self):
+        """
+        Cache the index on disk
+        """
+        index_file = self.CONFIG_MANAGER.action_index_file
+        try:
+            os.makedirs(os.path.dirname(index_file), exist_ok=True)
+            with open(index_file, "w", encoding="utf-8") as f:
+                json.dump({"version": ACTION_INDEX_VERSION, "files": self.index}, f)
+        except OSError as ex:
+            self.LOGGER.debug(f"can't write the action index {index_file}: {ex}")
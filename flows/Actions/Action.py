@@ -7,40 +7,81 @@ Copyright 2016 Davide Mastromatteo
 License: Apache-2.0
 """
 
-import gc
+import collections
 import glob
 import importlib
 import importlib.util
+import inspect
 import os
+import queue
 import site
-import time
+import sys
 import threading
-from threading import Thread
+import time
+import warnings
 
+from flows.ActionRegistry import ActionRegistry
 from flows.ConfigManager import ConfigManager
 from flows.FlowsLogger import FlowsLogger
 from flows.MessageDispatcher import MessageDispatcher
+from flows.Metrics import MetricsRegistry
+from flows.Profiler import Profiler
+from flows.Scheduler import Scheduler
+from flows.Tracer import CURRENT_INPUT, Tracer
+from flows.WorkerPool import WorkerPool
 
 
 class ActionInput:
     """
-    Standard input for every action in flows
+    Standard input for every action in flows.
+    It's allocated for every message, so it has no per instance __dict__.
+    trace_id and hops are only set for the messages sampled by the tracer
     """
 
-    sender = ""
-    receiver = ""
-    message = ""
-    file_system_event = None
-
-    def __init__(self, event, message, sender, receiver="*"):
-        super().__init__()
+    __slots__ = (
+        "sender",
+        "receiver",
+        "message",
+        "file_system_event",
+        "created",
+        "trace_id",
+        "hops",
+    )
+
+    def __init__(
+        self,
+        event,
+        message,
+        sender,
+        receiver="*",
+        created=None,
+        trace_id=None,
+        hops=None,
+    ):
         self.message = message
         self.file_system_event = event
-        self.sender = sender
+        self.sender = sys.intern(sender) if type(sender) is str else sender
         self.receiver = receiver
+        self.created = created if created is not None else time.time()
+        self.trace_id = trace_id
+        self.hops = hops
+
+    def __reduce__(self):
+        return (
+            ActionInput,
+            (
+                self.file_system_event,
+                self.message,
+                self.sender,
+                self.receiver,
+                self.created,
+                self.trace_id,
+                self.hops,
+            ),
+        )
 
 
-class Action(Thread):
+class Action:
     """
     Generic abstract class that should be subclassed to create
     custom action classes.
@@ -55,27 +96,110 @@ class Action(Thread):
     is_running = True
     monitored_input: list
     my_action_input = None
+    cycle_job = None
+    thread = None
     LOGGER = FlowsLogger.default_instance().get_logger()
     CONFIG_MANAGER = ConfigManager.default_instance()
     MESSAGE_DISPATCHER = MessageDispatcher.default_instance()
+    WORKER_POOL = WorkerPool.default_instance()
+    SCHEDULER = Scheduler.default_instance()
+    METRICS = MetricsRegistry.default_instance()
+    TRACER = Tracer.default_instance()
+    PROFILER = Profiler.default_instance()
+
+    INPUTS_METRIC = METRICS.counter(
+        "flows_action_inputs_total", "Inputs handled by the action", ["action"]
+    )
+    ERRORS_METRIC = METRICS.counter(
+        "flows_action_errors_total", "Errors raised by the action", ["action"]
+    )
+    INPUT_LATENCY_METRIC = METRICS.histogram(
+        "flows_action_input_seconds", "Time spent handling an input", ["action"]
+    )
+    CYCLE_LATENCY_METRIC = METRICS.histogram(
+        "flows_action_cycle_seconds", "Time spent running a cycle", ["action"]
+    )
+    MAILBOX_METRIC = METRICS.gauge(
+        "flows_action_mailbox_size", "Inputs waiting in the mailbox", ["action"]
+    )
+    DROPPED_METRIC = METRICS.counter(
+        "flows_action_dropped_inputs_total",
+        "Inputs dropped because the mailbox was full",
+        ["action"],
+    )
+
+    # max number of inputs handled before giving the worker back to the pool
+    mailbox_batch_size = 100
 
     python_files = []
 
     def __init__(self, name: str, configuration, managed_input: list):
         super().__init__()
 
-        # Set the action as a daemon
-        self.daemon = True
-
         # Init the action instance variables
         self.monitored_input = managed_input
         self.configuration = configuration
         self.name = name
 
+        self.cycle_interval = self.CONFIG_MANAGER.sleep_interval
+        if "cycle_interval" in self.configuration:
+            self.cycle_interval = float(self.configuration["cycle_interval"]) / 1000
+            if self.cycle_interval <= 0:
+                raise ValueError(
+                    str.format(
+                        "The action {0} is not properly configured: "
+                        "cycle_interval must be greater than 0",
+                        self.name,
+                    )
+                )
+        self.cycle_lock = threading.Lock()
+
+        # Init the mailbox where the inputs wait for a worker
+        queue_size = self.CONFIG_MANAGER.mailbox_size
+        if "queue_size" in self.configuration:
+            queue_size = int(self.configuration["queue_size"])
+
+        self.overflow = "block"
+        if "overflow" in self.configuration:
+            self.overflow = self.configuration["overflow"]
+
+        if self.overflow not in ("block", "drop_oldest", "drop_newest"):
+            raise ValueError(
+                str.format(
+                    "The action {0} is not properly configured: "
+                    "overflow must be block, drop_oldest or drop_newest",
+                    self.name,
+                )
+            )
+
+        # max number of coroutines of on_input_received running at once
+        max_in_flight = 100
+        if "max_in_flight" in self.configuration:
+            max_in_flight = int(self.configuration["max_in_flight"])
+        self.in_flight = threading.BoundedSemaphore(max_in_flight)
+
+        self.mailbox = queue.Queue(queue_size)
+        self.mailbox_lock = threading.Lock()
+        self.mailbox_scheduled = False
+        self.dropped_inputs = 0
+        # the inputs waiting for room in a full mailbox, with the block policy
+        self.held_inputs = collections.deque()
+        self.max_held_inputs = self.CONFIG_MANAGER.transport_queue_size
+
+        # Bind the metrics to the action
+        self.inputs_metric = self.INPUTS_METRIC.labels(self.name)
+        self.errors_metric = self.ERRORS_METRIC.labels(self.name)
+        self.input_latency_metric = self.INPUT_LATENCY_METRIC.labels(self.name)
+        self.cycle_latency_metric = self.CYCLE_LATENCY_METRIC.labels(self.name)
+        self.MAILBOX_METRIC.labels(self.name).set_function(
+            lambda: self.mailbox.qsize() + len(self.held_inputs)
+        )
+        self.DROPPED_METRIC.labels(self.name).set_function(lambda: self.dropped_inputs)
+
         # Launch custom configuration method
         self.on_init()
 
-        # Start the action (as a thread, the run method will be executed)
+        # Start the action
         self.start()
 
     def on_init(self):
@@ -120,31 +244,279 @@ class Action(Thread):
 
         self.MESSAGE_DISPATCHER.send_message(output_action)
 
+    def post_input(self, action_input):
+        """
+        Queue an input for the action, it will be handled by the worker pool.
+        When the mailbox is full, hold the input back or drop an input
+        according to the overflow policy. Returns False if action_input
+        has been dropped
+        """
+        if self.overflow == "block":
+            # the inputs are held back instead of waiting for room: the
+            # caller is the fetcher, that delivers to all the other actions
+            with self.mailbox_lock:
+                if len(self.held_inputs) == 0:
+                    try:
+                        self.mailbox.put_nowait(action_input)
+                        action_input = None
+                    except queue.Full:
+                        pass
+
+                if action_input is not None:
+                    if len(self.held_inputs) >= self.max_held_inputs:
+                        self._count_dropped_input()
+                        return False
+                    self.held_inputs.append(action_input)
+        elif self.overflow == "drop_newest":
+            try:
+                self.mailbox.put_nowait(action_input)
+            except queue.Full:
+                self._count_dropped_input()
+                return False
+        else:
+            while True:
+                try:
+                    self.mailbox.put_nowait(action_input)
+                    break
+                except queue.Full:
+                    pass
+
+                try:
+                    self.mailbox.get_nowait()
+                    self._count_dropped_input()
+                except queue.Empty:
+                    pass
+
+        with self.mailbox_lock:
+            if self.mailbox_scheduled:
+                return True
+            self.mailbox_scheduled = True
+
+        self.WORKER_POOL.submit(self._process_mailbox)
+        return True
+
+    def _release_held_input(self):
+        """
+        Move the oldest input held back into the mailbox, if there's room
+        """
+        with self.mailbox_lock:
+            if len(self.held_inputs) > 0:
+                try:
+                    self.mailbox.put_nowait(self.held_inputs[0])
+                    self.held_inputs.popleft()
+                except queue.Full:
+                    pass
+
+    def _count_dropped_input(self):
+        """
+        Keep track of the inputs dropped because the mailbox was full
+        """
+        self.dropped_inputs = self.dropped_inputs + 1
+        if self.dropped_inputs == 1:
+            self.LOGGER.warning(
+                f"the mailbox of the action {self.name} is full, "
+                f"dropping inputs ({self.overflow})"
+            )
+
+    def _process_mailbox(self):
+        """
+        Handle the inputs waiting in the mailbox, one at a time
+        """
+        for _ in range(self.mailbox_batch_size):
+            try:
+                action_input = self.mailbox.get_nowait()
+            except queue.Empty:
+                with self.mailbox_lock:
+                    if self.mailbox.empty() and len(self.held_inputs) == 0:
+                        self.mailbox_scheduled = False
+                        return
+                self._release_held_input()
+                continue
+
+            if len(self.held_inputs) > 0:
+                self._release_held_input()
+
+            if self.is_running:
+                self._handle_input(action_input)
+
+        # give the other actions a chance to run, then go on
+        self.WORKER_POOL.submit(self._process_mailbox)
+
+    def _handle_input(self, action_input):
+        """
+        Run on_input_received for an input
+        """
+        self.inputs_metric.inc()
+        start = time.perf_counter()
+
+        # the messages sent while handling a traced input belong to its trace
+        token = CURRENT_INPUT.set(action_input) if self.TRACER.enabled else None
+        try:
+            result = self.on_input_received(action_input)
+        except Exception as exc:
+            self.errors_metric.inc()
+            self.LOGGER.error(
+                f"error while handling an input in the action {self.name}: {str(exc)}"
+            )
+            return
+        finally:
+            if token is not None:
+                CURRENT_INPUT.reset(token)
+
+        # async def on_input_received: run it on the event loop, waiting
+        # here if too many of them are in flight
+        if inspect.isawaitable(result):
+            self.in_flight.acquire()
+            self.WORKER_POOL.submit_coroutine(
+                self._await_job(
+                    result,
+                    self.in_flight,
+                    "handling an input in",
+                    "on_input_received",
+                    start,
+                    action_input,
+                )
+            )
+        else:
+            self._job_done("on_input_received", start, action_input)
+
+    def _job_done(self, job, start, action_input=None):
+        """
+        Record how long a job of the action took
+        """
+        duration = time.perf_counter() - start
+        if job == "on_cycle":
+            self.cycle_latency_metric.observe(duration)
+        else:
+            self.input_latency_metric.observe(duration)
+
+        if self.PROFILER.enabled:
+            self.PROFILER.record(self.name, job, duration)
+
+        if action_input is not None and action_input.trace_id is not None:
+            self.TRACER.record_span(self.name, action_input, duration)
+
+    def start(self):
+        """
+        Start the action, scheduling its cycle if it has one
+        """
+        self.LOGGER.debug(f"action {self.name} is running")
+
+        for tmp_monitored_input in self.monitored_input:
+            sender = "*" + tmp_monitored_input + "*"
+            self.LOGGER.debug(f"action {self.name} is monitoring {sender}")
+
+        # most of the actions don't have a cycle, don't wake them up for nothing
+        if type(self).on_cycle is not Action.on_cycle:
+            self.cycle_job = self.SCHEDULER.call_every(
+                self.cycle_interval, self._run_cycle
+            )
+
+        # the actions used to be threads: a run method is still run in one
+        if type(self).run is not Action.run:
+            warnings.warn(
+                f"action {self.name}: overriding run is deprecated, "
+                "override on_cycle instead",
+                DeprecationWarning,
+            )
+            self.thread = threading.Thread(target=self.run, name=self.name)
+            self.thread.daemon = True
+            self.thread.start()
+
     def stop(self):
         """Stop the current action"""
         self.LOGGER.debug(f"action {self.name} stopped")
         self.is_running = False
+        if self.cycle_job is not None:
+            self.cycle_job.cancel()
         self.on_stop()
 
     def run(self):
         """
-        Start the action
+        Deprecated, the actions are no longer threads: the cycle is run by
+        the scheduler
         """
-        self.LOGGER.debug(f"action {self.name} is running")
+        warnings.warn(
+            "Action.run is deprecated, the cycle is run by the scheduler",
+            DeprecationWarning,
+            stacklevel=2,
+        )
 
-        for tmp_monitored_input in self.monitored_input:
-            sender = "*" + tmp_monitored_input + "*"
-            self.LOGGER.debug(f"action {self.name} is monitoring {sender}")
+    def is_alive(self):
+        """
+        Deprecated, the actions are no longer threads: return True until
+        the action is stopped
+        """
+        warnings.warn(
+            "Action.is_alive is deprecated, use is_running instead",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        if self.thread is not None:
+            return self.thread.is_alive()
+        return self.is_running
 
-        while self.is_running:
-            try:
-                time.sleep(self.CONFIG_MANAGER.sleep_interval)
-                self.on_cycle()
+    def join(self, timeout=None):
+        """
+        Deprecated, the actions are no longer threads: wait for the thread
+        of an overridden run method, if any
+        """
+        warnings.warn(
+            "Action.join is deprecated, the actions are no longer threads",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        if self.thread is not None:
+            self.thread.join(timeout)
 
-            except Exception as exc:
-                self.LOGGER.error(
-                    f"error while running the action {self.name}: {str(exc)}"
-                )
+    def _run_cycle(self):
+        """
+        Run a cycle of the action, unless the previous one is still running
+        """
+        if not self.is_running:
+            return
+
+        if not self.cycle_lock.acquire(blocking=False):
+            return
+
+        start = time.perf_counter()
+        try:
+            result = self.on_cycle()
+        except Exception as exc:
+            self.errors_metric.inc()
+            self.LOGGER.error(f"error while running the action {self.name}: {str(exc)}")
+            self.cycle_lock.release()
+            return
+
+        # async def on_cycle: the cycle is over when the coroutine is done
+        if inspect.isawaitable(result):
+            self.WORKER_POOL.submit_coroutine(
+                self._await_job(result, self.cycle_lock, "running", "on_cycle", start)
+            )
+        else:
+            self._job_done("on_cycle", start)
+            self.cycle_lock.release()
+
+    async def _await_job(
+        self, awaitable, lock, description, job, start, action_input=None
+    ):
+        """
+        Wait for a coroutine of the action, then release its lock
+        """
+        # the task has its own context, the one of the caller is not copied
+        if action_input is not None and self.TRACER.enabled:
+            CURRENT_INPUT.set(action_input)
+
+        try:
+            await awaitable
+        except Exception as exc:
+            self.errors_metric.inc()
+            self.LOGGER.error(
+                f"error while {description} the action {self.name}: {str(exc)}"
+            )
+        finally:
+            self._job_done(job, start, action_input)
+            lock.release()
 
     @classmethod
     def load_module(cls, module_name, module_filename):
@@ -235,20 +607,8 @@ class Action(Thread):
         cls.LOGGER.debug(f"configuration length: {len(configuration)}")
         cls.LOGGER.debug(f"input: {managed_input}")
 
-        # get the actions catalog
-        my_actions_file = Action.search_actions()
-
-        # load custom actions to find the right one
-        for filename in my_actions_file:
-            module_name = os.path.basename(os.path.normpath(filename))[:-3]
-
-            # garbage collect all the modules you load if they are not necessary
-            context = {}
-            Action.load_module(module_name, filename)
-            for subclass in Action.__subclasses__():
-                if subclass.type == action_code:
-                    action_class = subclass
-                    action = action_class(name, configuration, managed_input)
-                    return action
-            subclass = None
-            gc.collect()
+        action_class = ActionRegistry.default_instance().find_action_class(action_code)
+        if action_class is None:
+            return None
+
+        return action_class(name, configuration, managed_input)
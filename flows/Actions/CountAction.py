@@ -7,7 +7,6 @@ License: Apache-2.0
 """
 
 import datetime
-import threading
 from flows.Actions.Action import Action
 
 
@@ -27,16 +26,15 @@ class CountAction(Action):
     next_timer = None
 
     def run_operation(self):
+        if not self.is_running:
+            return
+
         self.send_message(str(self.counter))
         if self.partial_counter:
             self.counter = 0
 
-        if self.is_running:
-            self.start_timer()
-
     def start_timer(self):
-        self.next_timer = threading.Timer(self.timeout, self.run_operation)
-        self.next_timer.start()
+        self.next_timer = self.SCHEDULER.call_every(self.timeout, self.run_operation)
 
     def on_stop(self):
         if self.next_timer is not None:
@@ -49,6 +47,14 @@ class CountAction(Action):
         if "timeout" in self.configuration:
             self.timed_counter = True
             self.timeout = int(self.configuration["timeout"])
+            if self.timeout <= 0:
+                raise ValueError(
+                    str.format(
+                        "The count action {0} is not properly configured. "
+                        "The timeout parameter must be greater than 0",
+                        self.name,
+                    )
+                )
 
         if "partial" in self.configuration:
             self.partial_counter = True
@@ -9,6 +9,7 @@ Copyright 2016 Davide Mastromatteo
 import re
 import os
 from flows.Actions.Action import Action
+from flows.LiteralMatcher import LiteralMatcher
 
 
 class FilterAction(Action):
@@ -25,6 +26,10 @@ class FilterAction(Action):
 
     regexes = []
 
+    # regexes that can't be part of an alternation: back references,
+    # named groups, conditionals and global inline flags
+    SEPARATE_REGEX = re.compile(r"\\[1-9]|\(\?P[<=]|\(\?\(|\(\?[aiLmsux]+\)")
+
     def on_init(self):
         super().on_init()
 
@@ -32,9 +37,8 @@ class FilterAction(Action):
         if "regexes_file" in self.configuration:
             self.regexes_file = self.configuration["regexes_file"]
             if os.path.isfile(self.regexes_file):
-                file_containing_regexes = open(self.regexes_file)
-                self.regexes = file_containing_regexes.readlines()
-                file_containing_regexes.close()
+                with open(self.regexes_file) as file_containing_regexes:
+                    self.regexes = file_containing_regexes.readlines()
             else:
                 print(self.regexes_file + " not found, skipped")
 
@@ -49,32 +53,79 @@ class FilterAction(Action):
         if "ignorecase" in self.configuration:
             self.ignorecase = True
 
+        self.regexes = [regex.strip() for regex in self.regexes]
+        self.regexes = [regex for regex in dict.fromkeys(self.regexes) if regex != ""]
+
+        # the plain strings are searched all at once, without the regex engine
+        literals = [LiteralMatcher.literal(regex) for regex in self.regexes]
+        self.literal_matcher = None
+        if len([x for x in literals if x is not None]) > 1:
+            self.literal_matcher = LiteralMatcher(
+                [x for x in literals if x is not None], self.ignorecase
+            )
+            self.matchers = self._compile_regexes(
+                [x for x, literal in zip(self.regexes, literals) if literal is None]
+            )
+        else:
+            self.matchers = self._compile_regexes(self.regexes)
+
+    def _compile_regexes(self, regexes):
+        """
+        Compile the regexes once: the ones that can be combined in a single
+        alternation, searched in one pass, and the others one by one
+        """
+        flags = 0
+        if self.ignorecase:
+            flags = re.IGNORECASE
+
+        try:
+            # compiled one by one too, so each regex is checked on its own
+            compiled = [re.compile(regex, flags) for regex in regexes]
+        except re.error as error:
+            raise ValueError(
+                str.format(
+                    "The filter action {0} is not properly configured: "
+                    "invalid regex ({1})",
+                    self.name,
+                    error,
+                )
+            )
+
+        combined = [
+            x for x in compiled if self.SEPARATE_REGEX.search(x.pattern) is None
+        ]
+        if len(combined) < 2:
+            return compiled
+
+        matchers = [
+            x for x in compiled if self.SEPARATE_REGEX.search(x.pattern) is not None
+        ]
+        matchers.insert(
+            0, re.compile("|".join(f"(?:{x.pattern})" for x in combined), flags)
+        )
+
+        return matchers
+
+    def matches(self, message):
+        """
+        Return True if any of the regexes matches the message
+        """
+        if self.literal_matcher is not None and self.literal_matcher.search(message):
+            return True
+
+        for matcher in self.matchers:
+            if matcher.search(message) is not None:
+                return True
+
+        return False
+
     def on_input_received(self, action_input=None):
         super().on_input_received(action_input)
 
         # Action
         return_value = action_input.message
 
-        flags = 0
-        if self.ignorecase:
-            flags = re.IGNORECASE
-
         # Normal match: if any of the regexes matches, returns the input
-        if not self.invert_match:
-            for regex in self.regexes:
-                regex = regex.strip()
-                if regex != "":
-                    match = re.search(regex, action_input.message, flags)
-                    if match is not None:
-                        self.send_message(return_value)
-
-        # Inverted match: returns the input message only if NO conditions
-        # match!
-        else:
-            for regex in self.regexes:
-                regex = regex.strip()
-                match = re.search(regex, action_input.message, flags)
-                if match is not None:
-                    return None
-
+        # Inverted match: returns the input only if NO regex matches
+        if self.matches(action_input.message) != self.invert_match:
             self.send_message(return_value)
@@ -19,7 +19,6 @@ Copyright 2016 Davide Mastromatteo
 from flows.Actions.Action import Action
 import datetime
 from croniter import croniter
-import threading
 
 
 class CronAction(Action):
@@ -32,23 +31,74 @@ class CronAction(Action):
     crontab_schedule = "* * * * *"
     next = None
     cron = None
-    timeout = 60
     next_timer = None
 
+    # what to do with the runs missed during a stall: skip them,
+    # fire once for all of them or fire once for each of them
+    catch_up = "fire_once"
+    # a run later than this is considered missed
+    catch_up_grace = 60
+    # longest sleep between two checks of the wall clock
+    max_sleep = 60
+
+    # lateness metrics
+    fired_runs = 0
+    missed_runs = 0
+    last_lateness = 0.0
+    max_lateness = 0.0
+
     def run_operation(self):
+        if not self.is_running:
+            return
+
         now = datetime.datetime.now()
-        now = now.replace(microsecond=0)
 
-        if now >= self.next:
+        due_runs = []
+        while self.next <= now:
+            due_runs.append(self.next)
             self.next = self.cron.get_next(datetime.datetime)
-            self.send_message("CRON : " + self.name)
 
-        if self.is_running:
-            self.start_timer()
+        if len(due_runs) > 0:
+            self.fire(due_runs, now)
+
+        self.start_timer()
+
+    def fire(self, due_runs, now):
+        """
+        Send the messages for the due runs according to the catch up policy
+        """
+        latenesses = [(now - run).total_seconds() for run in due_runs]
+        self.last_lateness = latenesses[-1]
+        self.max_lateness = max(self.max_lateness, latenesses[0])
+
+        if self.catch_up == "fire_all":
+            fired = len(due_runs)
+        elif self.catch_up == "fire_once":
+            fired = 1
+        else:
+            fired = len([x for x in latenesses if x <= self.catch_up_grace])
+
+        missed = len(due_runs) - fired
+        if missed > 0:
+            self.LOGGER.warning(
+                f"the cron action {self.name} missed {missed} runs, "
+                f"{latenesses[0]:.1f} seconds late"
+            )
+
+        self.fired_runs = self.fired_runs + fired
+        self.missed_runs = self.missed_runs + missed
+        for _ in range(fired):
+            self.send_message("CRON : " + self.name)
 
     def start_timer(self):
-        self.next_timer = threading.Timer(self.timeout, self.run_operation)
-        self.next_timer.start()
+        # sleep until the next run, but at most max_sleep seconds: the
+        # scheduler clock stops while the system is suspended and ignores the
+        # changes of the system clock, so the fire time is checked again
+        # against the wall clock on every wake up
+        delay = (self.next - datetime.datetime.now()).total_seconds()
+        self.next_timer = self.SCHEDULER.call_later(
+            min(max(delay, 0), self.max_sleep), self.run_operation
+        )
 
     def on_stop(self):
         if self.next_timer is not None:
@@ -70,6 +120,36 @@ class CronAction(Action):
 
         self.crontab_schedule = self.configuration["crontab_schedule"]
 
+        if "catch_up" in self.configuration:
+            self.catch_up = self.configuration["catch_up"]
+
+        if self.catch_up not in ("skip", "fire_once", "fire_all"):
+            raise ValueError(
+                str.format(
+                    "The cron action {0} is not properly configured."
+                    "The catch_up parameter must be skip, fire_once or fire_all",
+                    self.name,
+                )
+            )
+
+        if "catch_up_grace" in self.configuration:
+            self.catch_up_grace = float(self.configuration["catch_up_grace"])
+
+        self.METRICS.gauge(
+            "flows_cron_lateness_seconds", "Lateness of the last cron run", ["action"]
+        ).labels(self.name).set_function(lambda: self.last_lateness)
+        self.METRICS.gauge(
+            "flows_cron_max_lateness_seconds",
+            "Highest lateness of the cron runs",
+            ["action"],
+        ).labels(self.name).set_function(lambda: self.max_lateness)
+        self.METRICS.counter(
+            "flows_cron_fired_runs_total", "Cron runs fired", ["action"]
+        ).labels(self.name).set_function(lambda: self.fired_runs)
+        self.METRICS.counter(
+            "flows_cron_missed_runs_total", "Cron runs missed", ["action"]
+        ).labels(self.name).set_function(lambda: self.missed_runs)
+
         now = datetime.datetime.now()
         now = now.replace(microsecond=0)
 
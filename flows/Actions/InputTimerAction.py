@@ -5,7 +5,6 @@ TimerAction.py
 Copyright 2016 Davide Mastromatteo
 """
 
-import threading
 from flows.Actions.Action import Action
 
 
@@ -19,14 +18,11 @@ class TimerAction(Action):
     next_timer = None
 
     def run_operation(self):
-        self.send_message("TIMER : " + self.name)
-
         if self.is_running:
-            self.start_timer()
+            self.send_message("TIMER : " + self.name)
 
     def start_timer(self):
-        self.next_timer = threading.Timer(self.timeout, self.run_operation)
-        self.next_timer.start()
+        self.next_timer = self.SCHEDULER.call_every(self.timeout, self.run_operation)
 
     def on_stop(self):
         if self.next_timer is not None:
@@ -37,5 +33,13 @@ class TimerAction(Action):
     def on_init(self):
         super().on_init()
         self.timeout = int(self.configuration["delay"])
+        if self.timeout <= 0:
+            raise ValueError(
+                str.format(
+                    "The timer action {0} is not properly configured. "
+                    "The delay parameter must be greater than 0",
+                    self.name,
+                )
+            )
 
         self.start_timer()
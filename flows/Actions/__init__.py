@@ -0,0 +1,36 @@
+"""
+flows built-in actions
+----------------------
+
+Copyright 2016 Davide Mastromatteo
+License: Apache-2.0
+"""
+
+# the module implementing each built-in action type, so that only
+# the actions used by the recipes are imported
+BUILTIN_ACTIONS = {
+    "adodb": "flows.Actions.AdoDBAction",
+    "append_variable_by_time": "flows.Actions.AppendVariableByTimeAction",
+    "buffer": "flows.Actions.BufferAction",
+    "check_if": "flows.Actions.CheckIfAction",
+    "check_url_for_200": "flows.Actions.CheckUrlFor200Action",
+    "command": "flows.Actions.CommandAction",
+    "count": "flows.Actions.CountAction",
+    "filter": "flows.Actions.FilterAction",
+    "generic": "flows.Actions.GenericCustomAction",
+    "get_url": "flows.Actions.GetUrlAction",
+    "hash": "flows.Actions.HashAction",
+    "alarm": "flows.Actions.InputAlarmAction",
+    "cron": "flows.Actions.InputCronAction",
+    "readfile": "flows.Actions.InputReadFileAction",
+    "tail": "flows.Actions.InputTailAction",
+    "timer": "flows.Actions.InputTimerAction",
+    "watchdog": "flows.Actions.InputWatchdogAction",
+    "log": "flows.Actions.LogAction",
+    "mail": "flows.Actions.MailAction",
+    "mail_if_response_error": "flows.Actions.MailIfResponseErrorAction",
+    "pass_on_interval": "flows.Actions.PassOnInterval",
+    "restart": "flows.Actions.RestartAction",
+    "substring": "flows.Actions.SubstringAction",
+    "webserver": "flows.Actions.WebserverAction",
+}
@@ -0,0 +1,113 @@
+"""
+Broker.py
+Forward the messages between the worker processes
+-------------------------------------------------
+
+The workers publish their messages to the frontend of the broker and
+receive the ones they are subscribed to from its backend. The broker
+forwards the subscriptions upstream, so every message is sent only to
+the workers that need it.
+
+The control socket is a barrier: the workers announce when their
+subscriptions are in place and the broker lets all of them start their
+actions at once, so no worker sends a message before the others can
+receive it.
+
+Copyright 2016 Davide Mastromatteo
+License: Apache-2.0
+"""
+
+import threading
+
+import zmq
+
+from flows.ConfigManager import ConfigManager
+from flows.FlowsLogger import FlowsLogger
+
+
+class Broker:
+    """
+    Broker class
+    XSUB/XPUB forwarder for the messages of the workers
+    """
+
+    LOGGER = FlowsLogger.default_instance().get_logger()
+    CONFIG_MANAGER = ConfigManager.default_instance()
+
+    def __init__(
+        self,
+        frontend_address="tcp://127.0.0.1:*",
+        backend_address="tcp://127.0.0.1:*",
+        control_address="tcp://127.0.0.1:*",
+    ):
+        super().__init__()
+
+        self.context = zmq.Context.instance()
+
+        self.frontend = self.context.socket(zmq.XSUB)
+        self.frontend.setsockopt(zmq.RCVHWM, self.CONFIG_MANAGER.transport_queue_size)
+        self.frontend.bind(frontend_address)
+
+        self.backend = self.context.socket(zmq.XPUB)
+        self.backend.setsockopt(zmq.SNDHWM, self.CONFIG_MANAGER.transport_queue_size)
+        self.backend.bind(backend_address)
+
+        self.control = self.context.socket(zmq.ROUTER)
+        self.control.bind(control_address)
+
+        # the actual addresses, with the ports chosen by the system
+        self.frontend_address = self.frontend.getsockopt_string(zmq.LAST_ENDPOINT)
+        self.backend_address = self.backend.getsockopt_string(zmq.LAST_ENDPOINT)
+        self.control_address = self.control.getsockopt_string(zmq.LAST_ENDPOINT)
+
+        self.thread = None
+
+    def start(self):
+        """
+        Forward the messages, on a thread of its own
+        """
+        self.LOGGER.debug(
+            f"broker forwarding from {self.frontend_address} to {self.backend_address}"
+        )
+        self.thread = threading.Thread(
+            target=self._forward, name="flows-broker", daemon=True
+        )
+        self.thread.start()
+
+    def _forward(self):
+        try:
+            zmq.proxy(self.frontend, self.backend)
+        except zmq.error.ContextTerminated:
+            pass
+
+    def wait_for_workers(self, workers, is_alive=lambda: True):
+        """
+        Wait for the workers to be ready, then let them start.
+        Returns False if is_alive() fails while waiting
+        """
+        ready_workers = []
+        while len(ready_workers) < workers:
+            if not self.control.poll(100):
+                if not is_alive():
+                    return False
+                continue
+
+            identity, _, message = self.control.recv_multipart()
+            self.LOGGER.debug(f"{message.decode('utf-8')} is ready")
+            ready_workers.append(identity)
+
+        for identity in ready_workers:
+            self.control.send_multipart([identity, b"", b"start"])
+
+        return True
+
+    @classmethod
+    def worker_ready(cls, control_address, worker_index):
+        """
+        Tell the broker a worker is ready and wait for the other ones
+        """
+        socket = zmq.Context.instance().socket(zmq.REQ)
+        socket.connect(control_address)
+        socket.send_string(f"worker {worker_index}")
+        socket.recv()
+        socket.close()
@@ -10,7 +10,6 @@ License: Apache-2.0
 import configparser
 import logging
 import os
-import random
 import threading
 
 from flows.FlowsLogger import FlowsLogger
@@ -26,18 +25,38 @@ class ConfigManager:
 
     sections = {}
     _instance = None
-    subscriber_socket_address = ""
-    publisher_socket_address = ""
+    socket_address = "tcp://127.0.0.1:*"  # -E parameter
     sleep_interval = 0.5  # -i parameter
     message_fetcher_sleep_interval = 0.5  # no parameter: auto throttle
-    queue_length_for_system_check = 100
-    messages_dispatched_for_system_check = 5000
-    seconds_between_queue_check = 60
+    fetcher_target_queue_length = 100  # -q parameter
+    fetcher_target_latency = 0.5  # -l parameter
     recipes = []  # parameters from command line
+    action_index_file = os.path.join(
+        os.path.expanduser("~"), ".cache", "flows", "action_index.json"
+    )
     show_stats = False  # -s <> 0 parameter
     tracing_mode: bool = False  # -t parameter
     stats_timeout = 60  # -s parameter
     fixed_message_fetcher_interval = False  # -m parameter
+    transport = "memory"  # -T parameter
+    wire_format = "pickle"  # -f parameter
+    worker_pool_size = 8  # -p parameter
+    mailbox_size = 1000  # max number of inputs waiting for an action
+    transport_queue_size = 100000  # max number of messages waiting to be fetched
+    message_fetcher_batch_size = 1  # -b parameter
+    event_driven_fetcher = False  # -e parameter
+    metrics_port = 0  # -M parameter
+    trace_file = None  # -D parameter
+    trace_format = "chrome"  # --TRACEFORMAT parameter
+    trace_sample_ratio = 0.01  # --TRACESAMPLE parameter
+    trace_buffer_size = 10000  # max number of spans kept
+    profile_file = None  # -P parameter
+    workers = 0  # -W parameter
+    worker_index = None  # set in the worker processes
+    broker_frontend_address = ""
+    broker_backend_address = ""
+    broker_control_address = ""
+    distributed = False  # broker options of the [configuration] section
 
     LOGGER = FlowsLogger.default_instance().get_logger()
 
@@ -72,34 +91,6 @@ class ConfigManager:
 
         self.LOGGER.debug("Read recipe " + filename)
 
-    def set_socket_address(self):
-        """
-        Set a random port to be used by zmq
-        """
-        self.LOGGER.debug("defining socket addresses for zmq")
-        random.seed()
-        default_port = random.randrange(5001, 5999)
-
-        internal_0mq_address = "tcp://127.0.0.1"
-        internal_0mq_port_subscriber = str(default_port)
-        internal_0mq_port_publisher = str(default_port)
-
-        self.LOGGER.info(
-            str.format(
-                f"zmq subsystem subscriber on {internal_0mq_port_subscriber} port"
-            )
-        )
-        self.LOGGER.info(
-            str.format(f"zmq subsystem publisher on {internal_0mq_port_publisher} port")
-        )
-
-        self.subscriber_socket_address = (
-            f"{internal_0mq_address}:{internal_0mq_port_subscriber}"
-        )
-        self.publisher_socket_address = (
-            f"{internal_0mq_address}:{internal_0mq_port_publisher}"
-        )
-
     def get_section(self, section_name):
         """
         Get the value of a single section of the configuration file
@@ -10,13 +10,24 @@ import argparse
 import asyncio
 import datetime
 import logging
-import pickle
-
-import zmq
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
 
 from flows import ConfigManager
 from flows import FlowsLogger
 from flows import MessageDispatcher
+from flows.Metrics import MetricsRegistry
+from flows.Profiler import Profiler
+from flows.Throttle import Throttle
+from flows.Tracer import Tracer
+from flows.ActionRegistry import ActionRegistry
+from flows.Broker import Broker
+from flows.WorkerPool import WorkerPool
 from flows.Actions.Action import Action
 
 __author__: str = "Davide Mastromatteo"
@@ -33,28 +44,49 @@ class FlowsManager:
     def __init__(self) -> None:
         self.actions = []
         self.subscriptions = {}
+        self.subscribed_inputs = set()
 
         self.fetched = 0
         self.isrunning = False
 
-        self.last_queue_check_count = 0
-        self.last_queue_check_date = datetime.datetime.now()
+        self.throttle = None
+        self.worker_processes = []
+        self.worker_is_ready = False
+        self.broker = None
+        self.socket_directory = None
         self.last_stats_check_date = datetime.datetime.now()
 
         self.LOGGER_INSTANCE = FlowsLogger.FlowsLogger.default_instance()
         self.LOGGER = FlowsLogger.FlowsLogger.default_instance().get_logger()
         self.CONFIG_MANAGER = ConfigManager.ConfigManager.default_instance()
+        self.PROFILER = Profiler.default_instance()
 
         args = self._parse_input_parameters()
         self._set_command_line_arguments(args)
 
+        # the [configuration] section may change the transport
+        self._read_recipes()
+
         self.MESSAGE_DISPATCHER = MessageDispatcher.MessageDispatcher.default_instance()
 
         self.LOGGER.debug("Initializing the message dispatcher")
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.SUB)
-        self.socket.connect(self.CONFIG_MANAGER.subscriber_socket_address)
-        self.socket.setsockopt(zmq.SUBSCRIBE, bytes("*", "utf-8"))
+        self.transport = self.MESSAGE_DISPATCHER.open_transport()
+
+        self.METRICS = MetricsRegistry.default_instance()
+        self.METRICS.counter(
+            "flows_messages_fetched_total", "Messages fetched from the transport"
+        ).labels().set_function(lambda: self.fetched)
+        self.METRICS.gauge(
+            "flows_queue_length", "Messages dispatched and not fetched yet"
+        ).labels().set_function(
+            lambda: self.MESSAGE_DISPATCHER.dispatched - self.fetched
+        )
+        self.METRICS.gauge(
+            "flows_message_fetcher_sleep_seconds",
+            "Sleep interval of the message fetcher",
+        ).labels().set_function(
+            lambda: self.CONFIG_MANAGER.message_fetcher_sleep_interval
+        )
 
     def _set_command_line_arguments(self, args):
         """
@@ -92,14 +124,117 @@ class FlowsManager:
             )
             self.CONFIG_MANAGER.fixed_message_fetcher_interval = True
 
+        if args.QUEUETARGET is not None:
+            self.LOGGER.debug(f"setting the target queue length to {args.QUEUETARGET}")
+            self.CONFIG_MANAGER.fetcher_target_queue_length = args.QUEUETARGET
+
+        if args.LATENCYTARGET is not None:
+            self.LOGGER.debug(
+                f"setting the target latency to {args.LATENCYTARGET} milliseconds"
+            )
+            self.CONFIG_MANAGER.fetcher_target_latency = (
+                float(args.LATENCYTARGET) / 1000
+            )
+
+        if args.TRANSPORT is not None:
+            self.LOGGER.debug(f"setting transport to {args.TRANSPORT}")
+            self.CONFIG_MANAGER.transport = args.TRANSPORT
+
+        if args.ENDPOINT is not None:
+            self.LOGGER.debug(f"setting the zmq endpoint to {args.ENDPOINT}")
+            self.CONFIG_MANAGER.socket_address = args.ENDPOINT
+
+        if args.WORKERS is not None and args.WORKERS > 0:
+            self.LOGGER.debug(f"running the actions in {args.WORKERS} worker processes")
+            self.CONFIG_MANAGER.workers = args.WORKERS
+
+        if args.FORMAT is not None:
+            self.LOGGER.debug(f"setting wire format to {args.FORMAT}")
+            self.CONFIG_MANAGER.wire_format = args.FORMAT
+
+        if args.POOLSIZE is not None and args.POOLSIZE > 0:
+            self.LOGGER.debug(f"setting worker pool size to {args.POOLSIZE}")
+            self.CONFIG_MANAGER.worker_pool_size = args.POOLSIZE
+
+        if args.BATCH is not None:
+            self.LOGGER.debug(f"setting message fetcher batch size to {args.BATCH}")
+            self.CONFIG_MANAGER.message_fetcher_batch_size = args.BATCH
+
+        if args.EVENTDRIVEN:
+            self.LOGGER.debug("event driven message fetcher active")
+            self.CONFIG_MANAGER.event_driven_fetcher = True
+
+        if args.TRACEFILE is not None:
+            self.LOGGER.debug(f"recording sampled traces to {args.TRACEFILE}")
+            self.CONFIG_MANAGER.trace_file = args.TRACEFILE
+            self.CONFIG_MANAGER.trace_format = args.TRACEFORMAT
+            if args.TRACESAMPLE is not None:
+                self.CONFIG_MANAGER.trace_sample_ratio = args.TRACESAMPLE
+            Tracer.default_instance().enable()
+
+        if args.PROFILE is not None:
+            self.LOGGER.debug(f"profiling the actions to {args.PROFILE}")
+            self.CONFIG_MANAGER.profile_file = args.PROFILE
+
+        if args.METRICSPORT is not None:
+            self.LOGGER.debug(f"serving metrics on port {args.METRICSPORT}")
+            self.CONFIG_MANAGER.metrics_port = args.METRICSPORT
+
+        if args.WORKERINDEX is not None:
+            self._set_worker_arguments(args)
+
         self.LOGGER.debug(f"recipes to be parsed: {args.FILENAME}")
         self.CONFIG_MANAGER.recipes = args.FILENAME
 
+    def _set_worker_arguments(self, args):
+        """
+        Configure a worker process, started by the flow manager with -W
+        """
+        index = args.WORKERINDEX
+        self.LOGGER.debug(f"running as worker {index}")
+        self.CONFIG_MANAGER.worker_index = index
+        (
+            self.CONFIG_MANAGER.broker_frontend_address,
+            self.CONFIG_MANAGER.broker_backend_address,
+            self.CONFIG_MANAGER.broker_control_address,
+        ) = args.BROKER.split(",")
+
+        # the messages are exchanged through the broker, and the queue
+        # length of a single worker doesn't tell anything to the throttle
+        self.CONFIG_MANAGER.transport = "zmq"
+        self.CONFIG_MANAGER.event_driven_fetcher = True
+
+        # every worker writes its own files and serves its own metrics
+        if self.CONFIG_MANAGER.metrics_port > 0:
+            self.CONFIG_MANAGER.metrics_port = (
+                self.CONFIG_MANAGER.metrics_port + index + 1
+            )
+        if self.CONFIG_MANAGER.trace_file is not None:
+            self.CONFIG_MANAGER.trace_file = f"{self.CONFIG_MANAGER.trace_file}.{index}"
+        if self.CONFIG_MANAGER.profile_file is not None:
+            self.CONFIG_MANAGER.profile_file = (
+                f"{self.CONFIG_MANAGER.profile_file}.{index}"
+            )
+
+    def _is_supervisor(self):
+        """
+        True if the actions run in worker processes started by this one
+        """
+        return (
+            self.CONFIG_MANAGER.workers > 0 and self.CONFIG_MANAGER.worker_index is None
+        )
+
     def start(self):
         """
         Start all the processes
         """
         self.LOGGER.info("starting the flow manager")
+        if self._is_supervisor():
+            self._run_workers()
+            return
+
+        if self.CONFIG_MANAGER.metrics_port > 0:
+            self.METRICS.start_http_server(self.CONFIG_MANAGER.metrics_port)
         self._start_actions()
         self._start_message_fetcher()
         self.LOGGER.debug("flow manager started")
@@ -111,6 +246,19 @@ class FlowsManager:
         self.LOGGER.info("stopping the flow manager")
         self._stop_actions()
         self.isrunning = False
+        WorkerPool.default_instance().shutdown()
+
+        if self._is_supervisor():
+            self._stop_workers()
+            self.LOGGER.debug("flow manager stopped")
+            return
+
+        if self.CONFIG_MANAGER.trace_file is not None:
+            Tracer.default_instance().dump()
+
+        if self.PROFILER.enabled:
+            self.PROFILER.dump()
+
         self.LOGGER.debug("flow manager stopped")
 
     def restart(self):
@@ -120,6 +268,7 @@ class FlowsManager:
         self.LOGGER.info("restarting the flow manager")
         self._stop_actions()  # stop the old actions
         self.actions = []  # clear the action list
+        self.subscriptions = {}  # clear the subscriptions table
         self._start_actions()  # start the configured actions
         self.LOGGER.debug("flow manager restarted")
 
@@ -129,8 +278,31 @@ class FlowsManager:
         """
         self.LOGGER.info("starting actions")
 
-        for recipe in self.CONFIG_MANAGER.recipes:
-            self.CONFIG_MANAGER.read_recipe(recipe)
+        self._read_recipes()
+
+        # subscribe to every configured input before starting the actions,
+        # so the messages sent while the others are starting are not lost
+        configured_inputs = set()
+        all_configured_inputs = set()
+        for section_name, section in self.CONFIG_MANAGER.sections.items():
+            if "input" in section:
+                inputs = [item.strip() for item in section["input"].split(",")]
+                all_configured_inputs.update(inputs)
+                if self._is_assigned_section(section_name):
+                    configured_inputs.update(inputs)
+        self._update_subscriptions(configured_inputs)
+
+        if self.CONFIG_MANAGER.distributed:
+            # any message may be needed by the actions of another node
+            self.transport.publish_topics(None)
+        elif self.CONFIG_MANAGER.worker_index is not None:
+            # the other workers need the messages of the actions of this one
+            self.transport.publish_topics(
+                "*" + my_input + "*" for my_input in all_configured_inputs
+            )
+
+        if self.CONFIG_MANAGER.broker_frontend_address:
+            self._wait_for_broker()
 
         list(
             map(
@@ -139,6 +311,292 @@ class FlowsManager:
             )
         )
 
+        # then keep only the inputs the actions are actually monitoring
+        self._update_subscriptions(self.subscriptions.keys())
+
+        self._log_import_times()
+
+    def _read_recipes(self):
+        """
+        Read the recipes and apply their [configuration] section
+        """
+        for recipe in self.CONFIG_MANAGER.recipes:
+            self.CONFIG_MANAGER.read_recipe(recipe)
+
+        self._read_recipe_configuration()
+
+    def _read_recipe_configuration(self):
+        """
+        Apply the settings of the [configuration] section of the recipes,
+        the command line arguments take precedence
+        """
+        configuration = self.CONFIG_MANAGER.sections.get("configuration", {})
+
+        if "profile" in configuration and self.CONFIG_MANAGER.profile_file is None:
+            self.CONFIG_MANAGER.profile_file = configuration["profile"]
+            if self.CONFIG_MANAGER.worker_index is not None:
+                self.CONFIG_MANAGER.profile_file = f"{self.CONFIG_MANAGER.profile_file}.{self.CONFIG_MANAGER.worker_index}"
+
+        if self.CONFIG_MANAGER.profile_file is not None and not self.PROFILER.enabled:
+            self.PROFILER.enable()
+
+        # join a broker shared by several flows processes, even on other hosts
+        if "broker" in configuration or "broker_listen" in configuration:
+            self.CONFIG_MANAGER.distributed = True
+            self.CONFIG_MANAGER.transport = "zmq"
+            self.CONFIG_MANAGER.event_driven_fetcher = True
+            self._check_broker_wire_format(configuration)
+
+        # the workers get the addresses of the broker from the supervisor
+        if self.CONFIG_MANAGER.worker_index is None:
+            if "broker_listen" in configuration and self.broker is None:
+                self._start_broker(configuration)
+
+            if "broker" in configuration:
+                (
+                    self.CONFIG_MANAGER.broker_frontend_address,
+                    self.CONFIG_MANAGER.broker_backend_address,
+                ) = self._read_broker_addresses(configuration, "broker")
+
+    @staticmethod
+    def _read_broker_addresses(configuration, option):
+        """
+        Return the frontend and the backend addresses of a broker option
+        """
+        addresses = [item.strip() for item in configuration[option].split(",")]
+        if len(addresses) != 2:
+            raise ValueError(
+                str.format(
+                    "The [configuration] section is not properly configured: "
+                    "{0} must be the frontend and the backend addresses, comma separated",
+                    option,
+                )
+            )
+
+        return addresses
+
+    def _check_broker_wire_format(self, configuration):
+        """
+        Refuse the pickle wire format with a broker reachable from the
+        network: anyone able to connect to it could run code on every node
+        """
+        if self.CONFIG_MANAGER.wire_format != "pickle":
+            return
+
+        addresses = []
+        for option in ("broker", "broker_listen"):
+            if option in configuration:
+                addresses.extend(self._read_broker_addresses(configuration, option))
+
+        if not all(self._is_local_address(address) for address in addresses):
+            raise ValueError(
+                "The [configuration] section is not properly configured: "
+                "the pickle wire format can't be used with a broker reachable "
+                "from the network, use -f compact or -f msgpack"
+            )
+
+    @staticmethod
+    def _is_local_address(address):
+        """
+        Return True if a zmq address can only be reached from this host
+        """
+        if address.startswith(("ipc://", "inproc://")):
+            return True
+
+        host = address.split("://", 1)[-1].rsplit(":", 1)[0].strip("[]")
+        return host in ("localhost", "::1") or host.startswith("127.")
+
+    def _start_broker(self, configuration):
+        """
+        Run the broker the flows processes of the other hosts connect to
+        """
+        frontend_address, backend_address = self._read_broker_addresses(
+            configuration, "broker_listen"
+        )
+        self.broker = Broker(frontend_address, backend_address)
+        self.broker.start()
+        self.LOGGER.info(
+            f"broker listening on {self.broker.frontend_address} "
+            f"and {self.broker.backend_address}"
+        )
+
+        # the flows of this host connect to it, unless the broker option says otherwise
+        self.CONFIG_MANAGER.broker_frontend_address = (
+            self.broker.frontend_address.replace("0.0.0.0", "127.0.0.1")
+        )
+        self.CONFIG_MANAGER.broker_backend_address = (
+            self.broker.backend_address.replace("0.0.0.0", "127.0.0.1")
+        )
+
+    def _log_import_times(self):
+        """
+        Log how long it took to import the modules of the actions
+        """
+        import_times = ActionRegistry.default_instance().import_times
+        log = self.LOGGER.info if self.CONFIG_MANAGER.show_stats else self.LOGGER.debug
+
+        lines = [
+            f"{seconds * 1000:10.1f} ms  {module_name}"
+            for module_name, seconds in sorted(
+                import_times.items(), key=lambda item: item[1], reverse=True
+            )
+        ]
+        total = sum(import_times.values()) * 1000
+        log(
+            "actions import times\n--- [IMPORTS] ---\n"
+            + "\n".join(lines)
+            + f"\n{total:10.1f} ms  total\n--- [ END ] ---"
+        )
+
+    def _is_assigned_section(self, section):
+        """
+        True if the action of the section runs in this process: the worker
+        is the one set with the worker key, or it's chosen by the name
+        """
+        if self.CONFIG_MANAGER.worker_index is None:
+            return True
+
+        return self._section_worker(section) == self.CONFIG_MANAGER.worker_index
+
+    def _section_worker(self, section):
+        """
+        Return the worker the action of the section runs in
+        """
+        workers = self.CONFIG_MANAGER.workers
+        configuration = self.CONFIG_MANAGER.sections[section]
+        if "worker" not in configuration:
+            # the same in every worker, unlike hash()
+            return zlib.crc32(section.encode("utf-8")) % workers
+
+        try:
+            worker = int(configuration["worker"])
+        except ValueError:
+            worker = -1
+
+        if worker < 0 or worker >= workers:
+            raise ValueError(
+                str.format(
+                    "The action {0} is not properly configured: "
+                    "worker must be between 0 and {1}",
+                    section,
+                    workers - 1,
+                )
+            )
+
+        return worker
+
+    def _wait_for_broker(self):
+        """
+        Wait for the subscriptions to reach the broker and, for a worker,
+        for the other workers too. Only the first time the actions start
+        """
+        if self.worker_is_ready:
+            return
+
+        self.LOGGER.debug(
+            f"waiting for the broker at {self.CONFIG_MANAGER.broker_frontend_address}"
+        )
+        self.transport.wait_until_connected()
+
+        if self.CONFIG_MANAGER.worker_index is not None:
+            self.LOGGER.debug("waiting for the other workers")
+            Broker.worker_ready(
+                self.CONFIG_MANAGER.broker_control_address,
+                self.CONFIG_MANAGER.worker_index,
+            )
+        self.worker_is_ready = True
+
+    def _run_workers(self):
+        """
+        Start the broker and the worker processes, then wait for them
+        """
+        workers = self.CONFIG_MANAGER.workers
+
+        # a misconfigured action stops the flow before starting the workers
+        for section in self.CONFIG_MANAGER.sections:
+            if section != "configuration":
+                self._section_worker(section)
+
+        broker = Broker(*self._worker_broker_addresses())
+        broker.start()
+
+        # the workers of a distributed flow join the shared broker, the
+        # local one is only used to start them together
+        frontend_address = broker.frontend_address
+        backend_address = broker.backend_address
+        if self.CONFIG_MANAGER.distributed:
+            frontend_address = self.CONFIG_MANAGER.broker_frontend_address
+            backend_address = self.CONFIG_MANAGER.broker_backend_address
+
+        command = [sys.executable, "-m", "flows"] + self.arguments
+        command.append(
+            "--BROKER="
+            + ",".join((frontend_address, backend_address, broker.control_address))
+        )
+
+        self.LOGGER.info(f"starting {workers} workers")
+        self.worker_processes = [
+            subprocess.Popen(command + [f"--WORKERINDEX={index}"])
+            for index in range(workers)
+        ]
+
+        if not broker.wait_for_workers(
+            workers, lambda: all(p.poll() is None for p in self.worker_processes)
+        ):
+            self.LOGGER.error("a worker stopped before starting its actions")
+            self._stop_workers()
+            return
+
+        self.LOGGER.info("workers started")
+        for worker_process in self.worker_processes:
+            worker_process.wait()
+
+    def _worker_broker_addresses(self):
+        """
+        Return the addresses of the broker of the workers: unix sockets
+        when the endpoint is ipc, free ports on the loopback otherwise
+        """
+        if not self.CONFIG_MANAGER.socket_address.startswith("ipc://"):
+            return ("tcp://127.0.0.1:*",) * 3
+
+        # removed when flows exits
+        self.socket_directory = tempfile.TemporaryDirectory(prefix="flows-")
+        return tuple(
+            "ipc://" + os.path.join(self.socket_directory.name, name)
+            for name in ("frontend", "backend", "control")
+        )
+
+    def _stop_workers(self):
+        """
+        Stop the worker processes, interrupting the ones that didn't
+        receive the interrupt with this process
+        """
+        for worker_process in self.worker_processes:
+            try:
+                worker_process.wait(1)
+            except subprocess.TimeoutExpired:
+                try:
+                    worker_process.send_signal(signal.SIGINT)
+                    worker_process.wait(10)
+                except (ValueError, subprocess.TimeoutExpired):
+                    worker_process.terminate()
+
+    def _update_subscriptions(self, inputs):
+        """
+        Subscribe the transport to the messages sent by the inputs
+        and unsubscribe it from all the others
+        """
+        inputs = set(inputs)
+        self.LOGGER.debug(f"updating the transport subscriptions to {inputs}")
+
+        for my_input in self.subscribed_inputs - inputs:
+            self.transport.unsubscribe("*" + my_input + "*")
+
+        for my_input in inputs - self.subscribed_inputs:
+            self.transport.subscribe("*" + my_input + "*")
+
+        self.subscribed_inputs = inputs
+
     def _start_action_for_section(self, section):
         """
         Start all the actions for a particular section
@@ -146,6 +604,9 @@ class FlowsManager:
         if section == "configuration":
             return
 
+        if not self._is_assigned_section(section):
+            return
+
         self.LOGGER.debug("starting actions for section " + section)
 
         # read the configuration of the action
@@ -211,59 +672,64 @@ class FlowsManager:
                 now - self.last_stats_check_date
             ).total_seconds() > self.CONFIG_MANAGER.stats_timeout:
                 self.last_stats_check_date = now
-                stats_string = f"showing stats\n--- [STATS] ---\nMessage Sent: {sent}\nMessage Received: {received}\nMessage Sleep Interval = {message_sleep_interval}\nQueue length = {queue_length}\n--- [ END ] ---"
+                dropped = sum(action.dropped_inputs for action in self.actions)
+                dropped = dropped + self.transport.dropped_messages
+                stats_string = f"showing stats\n--- [STATS] ---\nMessage Sent: {sent}\nMessage Received: {received}\nMessage Sleep Interval = {message_sleep_interval}\nQueue length = {queue_length}\nInputs dropped = {dropped}\n--- [ END ] ---"
                 self.LOGGER.info(stats_string)
 
-        # if we are accumulating messages, or we have processed at least 5000 messages
-        # since last check, we need to speed up the process
-        messages_limit_reached = (
-            sent - self.last_queue_check_count
-            > self.CONFIG_MANAGER.messages_dispatched_for_system_check
-        )
-        queue_limit_reached = (
-            queue_length > self.CONFIG_MANAGER.queue_length_for_system_check
-        )
-        time_limit_since_last_check_is_over = (
-            now - self.last_queue_check_date
-        ).total_seconds() > self.CONFIG_MANAGER.seconds_between_queue_check
-
-        if not self.CONFIG_MANAGER.fixed_message_fetcher_interval:
-            if (messages_limit_reached) or (
-                queue_limit_reached and time_limit_since_last_check_is_over
-            ):
-                cause = (
-                    "messages limit reached"
-                    if messages_limit_reached
-                    else "queue limit reached"
-                )
-                self.LOGGER.debug(f"triggering the throttle function due to {cause}")
-                self._adapt_sleep_interval(sent, received, queue_length, now)
+        # nothing to throttle if the fetcher doesn't sleep or -m fixed its interval
+        if (
+            self.CONFIG_MANAGER.event_driven_fetcher
+            or self.CONFIG_MANAGER.fixed_message_fetcher_interval
+        ):
+            return
+
+        if self.throttle is None:
+            self.throttle = Throttle()
+
+        self.CONFIG_MANAGER.message_fetcher_sleep_interval = self.throttle.update(
+            queue_length
+        )
 
     def _deliver_message(self, msg):
         """
-        Deliver the message to the subscripted actions
+        Deliver the message to the mailboxes of the subscripted actions
         """
         my_subscribed_actions = self.subscriptions.get(msg.sender, [])
         for action in my_subscribed_actions:
             if self.CONFIG_MANAGER.tracing_mode:
-                self.LOGGER.debug(f"delivering message to {action.name}")
-            action.on_input_received(msg)
+                self.LOGGER.debug("delivering message to %s", action.name)
+
+            if self.PROFILER.enabled:
+                start = time.perf_counter()
+                action.post_input(msg)
+                self.PROFILER.record(
+                    action.name, "delivery", time.perf_counter() - start
+                )
+            else:
+                action.post_input(msg)
 
     def _fetch_messages(self):
         """
-        Get an input message from the socket
+        Get a batch of input messages from the transport
         """
         try:
-            [_, msg] = self.socket.recv_multipart(flags=zmq.NOBLOCK)
+            batch_size = self.CONFIG_MANAGER.message_fetcher_batch_size
+            if batch_size > 0 and self.throttle is not None:
+                # drain the messages over the target at once
+                batch_size = batch_size + self.throttle.excess
+
+            messages = self.transport.receive(batch_size)
+            if len(messages) == 0:
+                return None
+
             if self.CONFIG_MANAGER.tracing_mode:
-                self.LOGGER.debug("fetched a new message")
-
-            self.fetched = self.fetched + 1
-            obj = pickle.loads(msg)
-            self._deliver_message(obj)
-            return obj
-        except zmq.error.Again:
-            return None
+                self.LOGGER.debug("fetched %d new messages", len(messages))
+
+            self.fetched = self.fetched + len(messages)
+            for obj in messages:
+                self._deliver_message(obj)
+            return messages
         except Exception as new_exception:
             self.LOGGER.error(new_exception)
             raise new_exception
@@ -275,59 +741,63 @@ class FlowsManager:
         self.LOGGER.debug("registering callbacks for message fetcher coroutine")
         self.isrunning = True
         while self.isrunning:
-            loop.call_soon(self._fetch_messages)
+            # check the messages queued during the sleep, before fetching them
             loop.call_soon(self._perform_system_check)
+            loop.call_soon(self._fetch_messages)
             await asyncio.sleep(self.CONFIG_MANAGER.message_fetcher_sleep_interval)
 
         self.LOGGER.debug("message fetcher stopped")
 
-    def _start_message_fetcher(self):
+    def _drain_transport(self):
         """
-        Start the message fetcher (called from coroutine)
+        Fetch all the messages waiting on the transport
         """
-        self.LOGGER.debug("starting the message fetcher")
-        event_loop = asyncio.get_event_loop()
-        try:
-            self.LOGGER.debug("entering event loop for message fetcher coroutine")
-            event_loop.run_until_complete(self.message_fetcher_coroutine(event_loop))
-        finally:
-            self.LOGGER.debug("closing the event loop")
-            event_loop.close()
+        while self.transport.has_messages():
+            self._fetch_messages()
 
-    def _adapt_sleep_interval(self, sent, received, queue, now):
+    async def event_driven_message_fetcher_coroutine(self, loop):
         """
-        Adapt sleep time based on the number of the messages in queue
+        Fetch the messages as soon as the transport receives them
         """
-        self.LOGGER.debug("adjusting sleep interval")
-
-        dispatched_since_last_check = sent - self.last_queue_check_count
-        seconds_since_last_check = (now - self.last_queue_check_date).total_seconds()
-
-        self.LOGGER.debug(
-            str(dispatched_since_last_check)
-            + " dispatched in the last "
-            + str(seconds_since_last_check)
-        )
-        sleep_time = (
-            seconds_since_last_check / (dispatched_since_last_check + queue + 1)
-        ) * 0.75
+        self.LOGGER.debug("registering reader for event driven message fetcher")
+        self.transport.add_reader(loop, self._drain_transport)
 
-        if sleep_time > 0.5:
-            sleep_time = 0.5
+        self.isrunning = True
+        try:
+            while self.isrunning:
+                # the zmq file descriptor is edge triggered: drain the transport
+                # periodically too, so a missed notification can't stall it
+                self._drain_transport()
+                self._perform_system_check()
+                await asyncio.sleep(self.CONFIG_MANAGER.sleep_interval)
+        finally:
+            self.transport.remove_reader(loop)
 
-        if sleep_time < 0.0001:
-            sleep_time = 0.0001
+        self.LOGGER.debug("message fetcher stopped")
 
-        self.last_queue_check_date = now
-        self.last_queue_check_count = sent
+    def _start_message_fetcher(self):
+        """
+        Start the message fetcher (called from coroutine)
+        """
+        self.LOGGER.debug("starting the message fetcher")
+        event_loop = asyncio.get_event_loop()
 
-        self.CONFIG_MANAGER.message_fetcher_sleep_interval = sleep_time
+        if self.PROFILER.enabled and hasattr(signal, "SIGUSR1"):
+            # run by the loop between two fetches: a plain signal handler could
+            # interrupt the fetcher while it holds the lock of a job of the profiler
+            event_loop.add_signal_handler(signal.SIGUSR1, self.PROFILER.dump)
 
-        sleep_interval_log_string = f"new sleep_interval = {sleep_time}"
-        self.LOGGER.debug(sleep_interval_log_string)
+        try:
+            self.LOGGER.debug("entering event loop for message fetcher coroutine")
+            if self.CONFIG_MANAGER.event_driven_fetcher:
+                fetcher_coroutine = self.event_driven_message_fetcher_coroutine
+            else:
+                fetcher_coroutine = self.message_fetcher_coroutine
 
-        if self.CONFIG_MANAGER.show_stats:
-            self.LOGGER.info(sleep_interval_log_string)
+            event_loop.run_until_complete(fetcher_coroutine(event_loop))
+        finally:
+            self.LOGGER.debug("closing the event loop")
+            event_loop.close()
 
     def _parse_input_parameters(self):
         """
@@ -355,6 +825,97 @@ class FlowsManager:
             metavar=("X"),
             help="dequeue a message each [X] tenth of milliseconds. (default = auto)",
         )
+        parser.add_argument(
+            "-q",
+            "--QUEUETARGET",
+            type=int,
+            metavar=("N"),
+            help="speed up the message fetcher when more than [N] messages are queued, or when the queue can't be fetched within the latency target. (default = 100)",
+        )
+        parser.add_argument(
+            "-l",
+            "--LATENCYTARGET",
+            type=int,
+            metavar=("MS"),
+            help="fetch the queued messages within [MS] milliseconds. (default = 500)",
+        )
+        parser.add_argument(
+            "-W",
+            "--WORKERS",
+            type=int,
+            metavar=("N"),
+            help="run the actions in [N] processes, exchanging the messages over zmq",
+        )
+        parser.add_argument(
+            "-T",
+            "--TRANSPORT",
+            choices=["memory", "zmq"],
+            help="messaging backend, zmq is only needed to talk with other processes. (default = memory)",
+        )
+        parser.add_argument(
+            "-E",
+            "--ENDPOINT",
+            metavar="ADDRESS",
+            help="zmq endpoint of the messages, tcp://, ipc:// or inproc://, "
+            "a * port is chosen by the system. (default = tcp://127.0.0.1:*)",
+        )
+        parser.add_argument(
+            "-f",
+            "--FORMAT",
+            choices=["pickle", "compact", "msgpack"],
+            help="wire format of the messages sent over zmq, the messages in other formats are discarded. (default = pickle)",
+        )
+        parser.add_argument(
+            "-p",
+            "--POOLSIZE",
+            type=int,
+            metavar=("N"),
+            help="handle the inputs of the actions on [N] threads. (default = 8)",
+        )
+        parser.add_argument(
+            "-b",
+            "--BATCH",
+            type=int,
+            metavar=("N"),
+            help="dequeue up to [N] messages per fetch, 0 means all the queued ones. (default = 1)",
+        )
+        parser.add_argument(
+            "-e",
+            "--EVENTDRIVEN",
+            action="store_true",
+            help="fetch the messages as soon as they arrive instead of polling",
+        )
+        parser.add_argument(
+            "-M",
+            "--METRICSPORT",
+            type=int,
+            metavar=("PORT"),
+            help="serve the metrics in the prometheus format on http://127.0.0.1:[PORT]/metrics",
+        )
+        parser.add_argument(
+            "-D",
+            "--TRACEFILE",
+            metavar=("FILE"),
+            help="trace a sample of the messages through the actions and write the traces to [FILE] on exit",
+        )
+        parser.add_argument(
+            "--TRACESAMPLE",
+            type=float,
+            metavar=("RATIO"),
+            help="ratio of the messages to be traced, between 0 and 1. (default = 0.01)",
+        )
+        parser.add_argument(
+            "--TRACEFORMAT",
+            choices=["chrome", "json"],
+            default="chrome",
+            help="format of the trace file, chrome trace events or plain json. (default = chrome)",
+        )
+        parser.add_argument(
+            "-P",
+            "--PROFILE",
+            metavar=("FILE"),
+            help="time the jobs of the actions and write the report to [FILE] on exit or on SIGUSR1",
+        )
         parser.add_argument(
             "-s",
             "--STATS",
@@ -374,5 +935,21 @@ class FlowsManager:
         )
         parser.add_argument("-V", "--VERSION", action="version", version=__version__)
 
+        parser.add_argument("--WORKERINDEX", type=int, help=argparse.SUPPRESS)
+        parser.add_argument("--BROKER", help=argparse.SUPPRESS)
+
+        # the workers are started with the same arguments
+        self.arguments = [
+            argument
+            for argument in sys.argv[1:]
+            if not argument.startswith(("--WORKERINDEX", "--BROKER"))
+        ]
+
         args = parser.parse_args()
+
+        if args.QUEUETARGET is not None and args.QUEUETARGET <= 0:
+            parser.error("argument -q/--QUEUETARGET: must be greater than 0")
+        if args.LATENCYTARGET is not None and args.LATENCYTARGET <= 0:
+            parser.error("argument -l/--LATENCYTARGET: must be greater than 0")
+
         return args
@@ -0,0 +1,128 @@
+"""
+LiteralMatcher.py
+Search many literal strings in a single pass
+--------------------------------------------
+
+An Aho-Corasick automaton of the literals: every character of the text
+is looked at once, whatever the number of literals, and the search stops
+at the first literal found. The automaton of the pyahocorasick package is
+used if it's installed, a pure Python one otherwise.
+
+Copyright 2016 Davide Mastromatteo
+License: Apache-2.0
+"""
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# characters with a special meaning in a regex
+REGEX_METACHARACTERS = frozenset(".^$*+?{}[]|()")
+
+
+class LiteralMatcher:
+    """
+    LiteralMatcher class
+    Tell if a text contains any of a set of literals
+    """
+
+    def __init__(self, literals, ignorecase=False):
+        super().__init__()
+        self.ignorecase = ignorecase
+        if ignorecase:
+            literals = [literal.lower() for literal in literals]
+
+        self.automaton = None
+        if ahocorasick is not None:
+            self.automaton = ahocorasick.Automaton()
+            for literal in literals:
+                self.automaton.add_word(literal, literal)
+            self.automaton.make_automaton()
+        else:
+            self._make_automaton(literals)
+
+    @staticmethod
+    def literal(regex):
+        """
+        Return the string matched by a regex made only of literal
+        characters, or None if the regex is a true one
+        """
+        characters = []
+        escaped = False
+        for character in regex:
+            if escaped:
+                # \d, \b, \1... are not literals
+                if character.isalnum():
+                    return None
+                characters.append(character)
+                escaped = False
+            elif character == "\\":
+                escaped = True
+            elif character in REGEX_METACHARACTERS:
+                return None
+            else:
+                characters.append(character)
+
+        if escaped or len(characters) == 0:
+            return None
+
+        return "".join(characters)
+
+    def _make_automaton(self, literals):
+        """
+        Build the trie of the literals, then the failure links breadth
+        first, marking the states where a literal ends
+        """
+        self.goto = [{}]
+        self.fail = [0]
+        self.final = [False]
+
+        for literal in literals:
+            state = 0
+            for character in literal:
+                next_state = self.goto[state].get(character)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][character] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.final.append(False)
+                state = next_state
+            self.final[state] = True
+
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for character, next_state in self.goto[state].items():
+                fail_state = self.fail[state]
+                while fail_state and character not in self.goto[fail_state]:
+                    fail_state = self.fail[fail_state]
+                self.fail[next_state] = self.goto[fail_state].get(character, 0)
+                # a literal ending in the failure state ends here too
+                self.final[next_state] = (
+                    self.final[next_state] or self.final[self.fail[next_state]]
+                )
+                queue.append(next_state)
+
+    def search(self, text):
+        """
+        Return True if the text contains any of the literals
+        """
+        if self.ignorecase:
+            text = text.lower()
+
+        if self.automaton is not None:
+            return next(self.automaton.iter(text), None) is not None
+
+        goto = self.goto
+        fail = self.fail
+        final = self.final
+        state = 0
+        for character in text:
+            while state and character not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(character, 0)
+            if final[state]:
+                return True
+
+        return False
@@ -1,6 +1,6 @@
 """
 MessageDispatcher.py
-Class to handle the dispatching of zmq messages
+Class to handle the dispatching of the messages
 -----------------------------------------------
 
 Copyright 2016 Davide Mastromatteo
@@ -8,15 +8,13 @@ License: Apache-2.0
 """
 
 import datetime
-import pickle
-import sys
 import threading
-import time
-
-import zmq
 
 from flows.ConfigManager import ConfigManager
 from flows.FlowsLogger import FlowsLogger
+from flows.Metrics import CounterChild, MetricsRegistry
+from flows.Tracer import Tracer
+from flows.Transport import Transport
 
 
 class MessageDispatcher:
@@ -30,6 +28,12 @@ class MessageDispatcher:
     _instance_lock = threading.Lock()
     LOGGER = FlowsLogger.default_instance().get_logger()
     CONFIG_MANAGER = ConfigManager.default_instance()
+    METRICS = MetricsRegistry.default_instance()
+    TRACER = Tracer.default_instance()
+
+    SENT_METRIC = METRICS.counter(
+        "flows_action_outputs_total", "Messages sent by the action", ["action"]
+    )
 
     @classmethod
     def default_instance(cls):
@@ -49,79 +53,79 @@ class MessageDispatcher:
 
         self.LOGGER.debug("initializing the message dispatcher")
 
-        self.dispatched = 0
+        self.dispatch_counter = CounterChild()
         self.last_stat = datetime.datetime.now()
-        self.context = None
-        self.socket = None
-
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.PUB)
-
-        self.LOGGER.debug("configuring the socket address for messaging subsystem")
-        for attempt in range(0, 6):
-            try:
-                self.CONFIG_MANAGER.set_socket_address()
-                self.socket.bind(self.CONFIG_MANAGER.publisher_socket_address)
-                break
-            except zmq.error.ZMQError:
-                if attempt == 5:
-                    self.LOGGER.error(
-                        """Can't find a suitable tcp port to connect.
-                        The execution will be terminated"""
-                    )
-                    sys.exit(8)
+        self.transport = None
 
-                self.LOGGER.warning(
-                    str.format(
-                        "error occured trying to connect to {0} ",
-                        self.CONFIG_MANAGER.publisher_socket_address,
-                    )
-                )
+        self.METRICS.counter(
+            "flows_messages_dispatched_total", "Messages dispatched"
+        ).labels().set_function(lambda: self.dispatched)
+
+        self.LOGGER.debug("message dispatcher initialized successfully")
 
-                self.LOGGER.warning(str.format("retrying... ({0}/{1})", attempt + 1, 5))
+    @property
+    def dispatched(self):
+        """
+        Number of messages dispatched so far
+        """
+        return self.dispatch_counter.get()
 
-                time.sleep(1)
+    def open_transport(self):
+        """
+        Create the transport configured for the messaging subsystem
+        """
+        if self.transport is None:
+            with self._instance_lock:
+                if self.transport is None:
+                    self.transport = Transport.create_transport(
+                        self.CONFIG_MANAGER.transport
+                    )
 
-        self.LOGGER.debug("message dispatcher initialized successfully")
+        return self.transport
 
     def send_message(self, message):
         """
-        Dispatch a message using 0mq
+        Dispatch a message using the configured transport.
+        It's called by every action thread, so it doesn't take any lock:
+        the transports are safe to be used by many producers
         """
-        with self._instance_lock:
-            if message is None:
-                self.LOGGER.error("can't deliver a null messages")
-                return
-
-            if message.sender is None:
-                self.LOGGER.error(
-                    f"can't deliver anonymous messages with body {message.body}"
-                )
-                return
-
-            if message.receiver is None:
-                self.LOGGER.error(
-                    f"can't deliver message from {message.sender}: recipient not specified"
-                )
-                return
-
-            if message.message is None:
-                self.LOGGER.error(
-                    f"can't deliver message with no body from {message.sender}"
-                )
-                return
-
-            sender = "*" + message.sender + "*"
-            self.socket.send_multipart([bytes(sender, "utf-8"), pickle.dumps(message)])
-
-            if self.CONFIG_MANAGER.tracing_mode:
-                self.LOGGER.debug(
-                    "dispatched : "
-                    + message.sender
-                    + "-"
-                    + message.message
-                    + "-"
-                    + message.receiver
-                )
-
-            self.dispatched = self.dispatched + 1
+        if message is None:
+            self.LOGGER.error("can't deliver a null messages")
+            return
+
+        if message.sender is None:
+            self.LOGGER.error(
+                f"can't deliver anonymous messages with body {message.body}"
+            )
+            return
+
+        if message.receiver is None:
+            self.LOGGER.error(
+                f"can't deliver message from {message.sender}: recipient not specified"
+            )
+            return
+
+        if message.message is None:
+            self.LOGGER.error(
+                f"can't deliver message with no body from {message.sender}"
+            )
+            return
+
+        if self.TRACER.enabled:
+            self.TRACER.trace_message(message)
+
+        if not self.transport.send("*" + message.sender + "*", message):
+            return
+
+        if self.CONFIG_MANAGER.tracing_mode:
+            # formatted by the logger, only if the record is emitted
+            self.LOGGER.debug(
+                "dispatched : %s-%s-%s",
+                message.sender,
+                message.message,
+                message.receiver,
+            )
+
+        # the counters are incremented without locks, in a cell per thread
+        self.dispatch_counter.inc()
+        self.SENT_METRIC.labels(message.sender).inc()
@@ -0,0 +1,353 @@
+"""
+Metrics.py
+Counters, gauges and histograms describing how the flows are running
+--------------------------------------------------------------------
+
+The metrics can be read with MetricsRegistry.collect(), or in the
+Prometheus text exposition format with MetricsRegistry.expose(), which
+is also served over http when the -M parameter is specified.
+
+Copyright 2016 Davide Mastromatteo
+License: Apache-2.0
+"""
+
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from flows.FlowsLogger import FlowsLogger
+
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+    10.0,
+)
+
+
+class MetricChild:
+    """
+    The value of a metric for a set of label values
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+        self.function = None
+
+    def inc(self, amount=1):
+        """
+        Increment the value
+        """
+        with self.lock:
+            self.value = self.value + amount
+
+    def set(self, value):
+        """
+        Set the value
+        """
+        self.value = value
+
+    def set_function(self, function):
+        """
+        Read the value from function each time the metric is collected
+        """
+        self.function = function
+
+    def get(self):
+        """
+        Return the current value
+        """
+        if self.function is not None:
+            return self.function()
+        return self.value
+
+
+class CounterChild(MetricChild):
+    """
+    The value of a counter, incremented without taking a lock: each thread
+    counts in a cell of its own and the cells are summed when it's read
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.local = threading.local()
+        self.cells = []
+
+    def inc(self, amount=1):
+        """
+        Increment the value
+        """
+        cell = getattr(self.local, "cell", None)
+        if cell is None:
+            cell = self.local.cell = [0]
+            with self.lock:
+                self.cells.append(cell)
+        cell[0] = cell[0] + amount
+
+    def get(self):
+        """
+        Return the current value
+        """
+        if self.function is not None:
+            return self.function()
+        return self.value + sum(cell[0] for cell in list(self.cells))
+
+
+class HistogramChild:
+    """
+    The observations of a histogram for a set of label values
+    """
+
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """
+        Record an observation
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] = self.counts[index] + 1
+            self.sum = self.sum + value
+            self.count = self.count + 1
+
+    def get(self):
+        """
+        Return the cumulative bucket counts, the sum and the count
+        """
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+
+        cumulative = []
+        running = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            running = running + bucket_count
+            cumulative.append((bound, running))
+
+        return {"buckets": cumulative, "sum": total, "count": count}
+
+
+class Metric:
+    """
+    Metric class
+    A named metric, with a child for each set of label values
+    """
+
+    type = ""
+
+    def __init__(self, name, documentation, label_names=()):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def new_child(self):
+        return MetricChild()
+
+    def labels(self, *label_values):
+        """
+        Return the child for the label values
+        """
+        child = self.children.get(label_values)
+        if child is None:
+            label_values = tuple(str(value) for value in label_values)
+            with self.lock:
+                child = self.children.setdefault(label_values, self.new_child())
+        return child
+
+    def expose(self):
+        """
+        Return the metric in the Prometheus text exposition format
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for label_values, child in list(self.children.items()):
+            lines.extend(self.expose_child(label_values, child))
+        return lines
+
+    def expose_child(self, label_values, child):
+        return [f"{self.name}{self.format_labels(label_values)} {child.get()}"]
+
+    def format_labels(self, label_values, extra=()):
+        pairs = list(zip(self.label_names, label_values)) + list(extra)
+        if len(pairs) == 0:
+            return ""
+
+        escaped = (
+            (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+            for name, value in pairs
+        )
+        return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Counter(Metric):
+    """
+    A value that only goes up
+    """
+
+    type = "counter"
+
+    def new_child(self):
+        return CounterChild()
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down
+    """
+
+    type = "gauge"
+
+
+class Histogram(Metric):
+    """
+    The distribution of the observed values
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+
+    def new_child(self):
+        return HistogramChild(self.buckets)
+
+    def expose_child(self, label_values, child):
+        values = child.get()
+        lines = []
+        for bound, count in values["buckets"]:
+            bound = "+Inf" if bound == float("inf") else str(bound)
+            labels = self.format_labels(label_values, [("le", bound)])
+            lines.append(f"{self.name}_bucket{labels} {count}")
+
+        labels = self.format_labels(label_values)
+        lines.append(f"{self.name}_sum{labels} {values['sum']}")
+        lines.append(f"{self.name}_count{labels} {values['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    MetricsRegistry class
+    Keep all the metrics of the process
+    """
+
+    # singleton variables
+    _instance = None
+    _instance_lock = threading.Lock()
+    LOGGER = FlowsLogger.default_instance().get_logger()
+
+    @classmethod
+    def default_instance(cls):
+        """
+        For use like a singleton, return the existing instance of the object
+        or a new instance
+        """
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = MetricsRegistry()
+
+        return cls._instance
+
+    def __init__(self):
+        super().__init__()
+        self.metrics = {}
+        self.server = None
+
+    def _register(self, metric_class, name, *args, **kwargs):
+        with self._instance_lock:
+            if name not in self.metrics:
+                self.metrics[name] = metric_class(name, *args, **kwargs)
+            return self.metrics[name]
+
+    def counter(self, name, documentation, label_names=()):
+        """
+        Return the counter called name, creating it if needed
+        """
+        return self._register(Counter, name, documentation, label_names)
+
+    def gauge(self, name, documentation, label_names=()):
+        """
+        Return the gauge called name, creating it if needed
+        """
+        return self._register(Gauge, name, documentation, label_names)
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        """
+        Return the histogram called name, creating it if needed
+        """
+        return self._register(Histogram, name, documentation, label_names, buckets)
+
+    def collect(self):
+        """
+        Return the current value of all the metrics as a dictionary
+        of {metric name: {label values: value}}
+        """
+        return {
+            name: {
+                label_values: child.get()
+                for label_values, child in list(metric.children.items())
+            }
+            for name, metric in list(self.metrics.items())
+        }
+
+    def expose(self):
+        """
+        Return all the metrics in the Prometheus text exposition format
+        """
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+    def start_http_server(self, port, host="127.0.0.1"):
+        """
+        Serve the metrics on http://host:port/metrics
+        """
+        registry = self
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            """
+            Return the exposition of the metrics
+            """
+
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+
+                body = registry.expose().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        self.server.daemon_threads = True
+        threading.Thread(
+            target=self.server.serve_forever, name="flows-metrics", daemon=True
+        ).start()
+        self.LOGGER.info(f"serving metrics on http://{host}:{port}/metrics")
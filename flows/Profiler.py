@@ -0,0 +1,166 @@
+"""
+Profiler.py
+Time spent by the actions in their jobs
+---------------------------------------
+
+When profiling is active, every run of on_input_received and on_cycle,
+and every delivery of a message to a mailbox, is timed. The report, with
+count, total, mean, p50 and p99 for each action, is written when flows
+stops or when it receives SIGUSR1.
+
+Copyright 2016 Davide Mastromatteo
+License: Apache-2.0
+"""
+
+import random
+import threading
+
+from flows.ConfigManager import ConfigManager
+from flows.FlowsLogger import FlowsLogger
+
+
+class JobStats:
+    """
+    Timings of a job of an action. The percentiles are computed on a
+    uniform sample of the timings, so the memory used is bounded
+    """
+
+    def __init__(self, sample_size):
+        self.lock = threading.Lock()
+        self.sample_size = sample_size
+        self.samples = []
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, duration):
+        """
+        Add a timing
+        """
+        with self.lock:
+            self.count = self.count + 1
+            self.total = self.total + duration
+            if duration > self.max:
+                self.max = duration
+
+            if len(self.samples) < self.sample_size:
+                self.samples.append(duration)
+            else:
+                # reservoir sampling
+                index = random.randrange(self.count)
+                if index < self.sample_size:
+                    self.samples[index] = duration
+
+    def percentile(self, percent):
+        """
+        Return the timing below which percent of the timings fall
+        """
+        with self.lock:
+            samples = sorted(self.samples)
+
+        if len(samples) == 0:
+            return 0.0
+
+        return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+
+class Profiler:
+    """
+    Profiler class
+    Collect the timings of the jobs of the actions
+    """
+
+    # singleton variables
+    _instance = None
+    _instance_lock = threading.Lock()
+    LOGGER = FlowsLogger.default_instance().get_logger()
+    CONFIG_MANAGER = ConfigManager.default_instance()
+
+    # number of timings kept for each job to compute the percentiles
+    sample_size = 10000
+    # number of actions listed among the most costly ones
+    top_actions = 10
+
+    @classmethod
+    def default_instance(cls):
+        """
+        For use like a singleton, return the existing instance of the object
+        or a new instance
+        """
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = Profiler()
+
+        return cls._instance
+
+    def __init__(self):
+        super().__init__()
+        self.enabled = False
+        self.stats = {}
+
+    def enable(self):
+        """
+        Start timing the jobs of the actions
+        """
+        self.LOGGER.debug(
+            f"profiling the actions to {self.CONFIG_MANAGER.profile_file}"
+        )
+        self.enabled = True
+
+    def record(self, action_name, job, duration):
+        """
+        Add the timing of a job of an action
+        """
+        key = (action_name, job)
+        stats = self.stats.get(key)
+        if stats is None:
+            with self._instance_lock:
+                stats = self.stats.setdefault(key, JobStats(self.sample_size))
+
+        stats.record(duration)
+
+    def report(self):
+        """
+        Return the report of the timings, as text
+        """
+        stats = sorted(
+            list(self.stats.items()), key=lambda item: item[1].total, reverse=True
+        )
+
+        lines = [
+            f"{'action':<20} {'job':<18} {'count':>10} {'total s':>10} "
+            f"{'mean ms':>10} {'p50 ms':>10} {'p99 ms':>10} {'max ms':>10}"
+        ]
+        for (action_name, job), job_stats in stats:
+            mean = job_stats.total / job_stats.count if job_stats.count else 0.0
+            lines.append(
+                f"{action_name:<20} {job:<18} {job_stats.count:>10} "
+                f"{job_stats.total:>10.3f} {mean * 1000:>10.3f} "
+                f"{job_stats.percentile(50) * 1000:>10.3f} "
+                f"{job_stats.percentile(99) * 1000:>10.3f} "
+                f"{job_stats.max * 1000:>10.3f}"
+            )
+
+        totals = {}
+        for (action_name, _), job_stats in stats:
+            totals[action_name] = totals.get(action_name, 0.0) + job_stats.total
+
+        lines.append("")
+        lines.append("most costly actions")
+        for action_name, total in sorted(
+            totals.items(), key=lambda item: item[1], reverse=True
+        )[: self.top_actions]:
+            lines.append(f"{action_name:<20} {total:>10.3f} s")
+
+        return "\n".join(lines) + "\n"
+
+    def dump(self, filename=None):
+        """
+        Write the report to the profile file
+        """
+        filename = filename or self.CONFIG_MANAGER.profile_file
+        with open(filename, "w", encoding="utf-8") as profile_file:
+            profile_file.write(self.report())
+
+        self.LOGGER.info(f"profile of the actions written to {filename}")
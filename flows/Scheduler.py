@@ -0,0 +1,166 @@
+"""
+Scheduler.py
+Shared scheduler for the time driven jobs of the actions
+--------------------------------------------------------
+
+A single thread keeps a heap of jobs ordered by deadline and hands each
+job over to the worker pool when its deadline is met. Deadlines use the
+monotonic clock and periodic jobs are rescheduled from their previous
+deadline, so they don't drift.
+
+Copyright 2016 Davide Mastromatteo
+License: Apache-2.0
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+from flows.FlowsLogger import FlowsLogger
+from flows.WorkerPool import WorkerPool
+
+
+class ScheduledJob:
+    """
+    A job registered with the scheduler
+    """
+
+    __slots__ = ("deadline", "interval", "callback", "cancelled")
+
+    def __init__(self, deadline, callback, interval=None):
+        self.deadline = deadline
+        self.interval = interval
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Don't run the job anymore
+        """
+        self.cancelled = True
+
+
+class Scheduler:
+    """
+    Scheduler class
+    Run the jobs of all the actions at their deadline using one thread
+    """
+
+    # singleton variables
+    _instance = None
+    _instance_lock = threading.Lock()
+    LOGGER = FlowsLogger.default_instance().get_logger()
+    WORKER_POOL = WorkerPool.default_instance()
+
+    @classmethod
+    def default_instance(cls):
+        """
+        For use like a singleton, return the existing instance of the object
+        or a new instance
+        """
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = Scheduler()
+
+        return cls._instance
+
+    def __init__(self):
+        super().__init__()
+
+        self.jobs = []
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def call_at(self, deadline, callback, interval=None):
+        """
+        Run callback when time.monotonic() reaches deadline,
+        then every interval seconds if interval is specified
+        """
+        if interval is not None and not interval > 0:
+            raise ValueError(
+                f"the interval of a periodic job must be positive, not {interval}"
+            )
+
+        job = ScheduledJob(deadline, callback, interval)
+
+        with self.condition:
+            self._push(job)
+
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self._run, name="flows-scheduler", daemon=True
+                )
+                self.thread.start()
+
+            self.condition.notify()
+
+        return job
+
+    def call_later(self, delay, callback):
+        """
+        Run callback once, after delay seconds
+        """
+        return self.call_at(time.monotonic() + delay, callback)
+
+    def call_every(self, interval, callback):
+        """
+        Run callback every interval seconds, starting in interval seconds
+        """
+        return self.call_at(time.monotonic() + interval, callback, interval)
+
+    def _push(self, job):
+        heapq.heappush(self.jobs, (job.deadline, next(self.sequence), job))
+
+    def _next_job(self):
+        """
+        Wait for the first job to be due and return it
+        """
+        with self.condition:
+            while True:
+                if len(self.jobs) == 0:
+                    self.condition.wait()
+                    continue
+
+                deadline, _, job = self.jobs[0]
+                if job.cancelled:
+                    heapq.heappop(self.jobs)
+                    continue
+
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+
+                heapq.heappop(self.jobs)
+
+                if job.interval is not None:
+                    # skip the runs we are too late for, keeping the phase
+                    missed_runs = int(-delay // job.interval)
+                    job.deadline = deadline + (missed_runs + 1) * job.interval
+                    self._push(job)
+
+                return job
+
+    def _run(self):
+        """
+        Hand the jobs over to the worker pool when they are due
+        """
+        while True:
+            # the thread runs the jobs of every action, it must never stop
+            try:
+                job = self._next_job()
+                self.WORKER_POOL.submit(self._run_job, job)
+            except Exception as exc:
+                self.LOGGER.error(f"error while scheduling a job: {str(exc)}")
+
+    def _run_job(self, job):
+        if job.cancelled:
+            return
+
+        try:
+            job.callback()
+        except Exception as exc:
+            self.LOGGER.error(f"error while running a scheduled job: {str(exc)}")
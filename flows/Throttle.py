@@ -0,0 +1,95 @@
+"""
+Throttle.py
+Control of the sleep interval of the polling message fetcher
+------------------------------------------------------------
+
+The messages queued during the sleep are counted before every fetch.
+When they are more than the target the sleep interval is cut, at least in
+half and more the more they are, and the fetcher takes the messages over
+the target too, so a burst is drained at once. A shorter queue is cut
+down too when fetching it one batch per interval would take longer than
+the latency target. When the queue is empty the interval grows by a
+fixed step, up to the latency target: a message waits at most one
+interval before being fetched.
+
+Copyright 2016 Davide Mastromatteo
+License: Apache-2.0
+"""
+
+from flows.ConfigManager import ConfigManager
+from flows.FlowsLogger import FlowsLogger
+from flows.Metrics import MetricsRegistry
+
+
+class Throttle:
+    """
+    Throttle class
+    Additive increase, multiplicative decrease of the sleep interval
+    """
+
+    LOGGER = FlowsLogger.default_instance().get_logger()
+    CONFIG_MANAGER = ConfigManager.default_instance()
+    METRICS = MetricsRegistry.default_instance()
+
+    DECISIONS_METRIC = METRICS.counter(
+        "flows_throttle_decisions_total",
+        "Changes of the sleep interval of the message fetcher",
+        ["decision"],
+    )
+
+    min_interval = 0.0001
+    increase_step = 0.005
+    decrease_factor = 0.5
+
+    def __init__(self):
+        super().__init__()
+        self.target_queue_length = self.CONFIG_MANAGER.fetcher_target_queue_length
+        self.max_interval = self.CONFIG_MANAGER.fetcher_target_latency
+        self.interval = min(
+            self.CONFIG_MANAGER.message_fetcher_sleep_interval, self.max_interval
+        )
+        # messages over the target, to be fetched besides the batch
+        self.excess = 0
+
+        self.increase_metric = self.DECISIONS_METRIC.labels("increase")
+        self.decrease_metric = self.DECISIONS_METRIC.labels("decrease")
+        self.METRICS.gauge(
+            "flows_throttle_target_queue_length",
+            "Queue length above which the message fetcher speeds up",
+        ).labels().set_function(lambda: self.target_queue_length)
+
+    def update(self, queue_length):
+        """
+        Return the sleep interval for the queue length
+        """
+        self.excess = max(queue_length - self.target_queue_length, 0)
+        batch_size = self.CONFIG_MANAGER.message_fetcher_batch_size
+
+        if self.excess > 0:
+            if self.interval > self.min_interval:
+                factor = min(
+                    self.decrease_factor, self.target_queue_length / queue_length
+                )
+                self.interval = max(self.interval * factor, self.min_interval)
+                self.decrease_metric.inc()
+                if self.CONFIG_MANAGER.tracing_mode:
+                    self.LOGGER.debug(
+                        "%d messages queued, new sleep interval = %f",
+                        queue_length,
+                        self.interval,
+                    )
+        elif (
+            queue_length > 0
+            and batch_size > 0
+            and queue_length * self.interval > self.max_interval * batch_size
+        ):
+            # the queue wouldn't be drained within the latency target
+            self.interval = max(
+                self.max_interval * batch_size / queue_length, self.min_interval
+            )
+            self.decrease_metric.inc()
+        elif queue_length == 0 and self.interval < self.max_interval:
+            self.interval = min(self.interval + self.increase_step, self.max_interval)
+            self.increase_metric.inc()
+
+        return self.interval
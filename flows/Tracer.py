@@ -0,0 +1,197 @@
+"""
+Tracer.py
+Follow sampled messages through the chain of actions
+----------------------------------------------------
+
+A sampled message gets a trace id and a list of hops, the actions that
+sent it with the time they sent it. The messages sent while handling a
+traced input inherit its trace id and its hops, and the time spent by
+every action handling a traced input is recorded in a ring buffer, that
+is written to the trace file when flows stops.
+
+Copyright 2016 Davide Mastromatteo
+License: Apache-2.0
+"""
+
+import collections
+import contextvars
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+from flows.ConfigManager import ConfigManager
+from flows.FlowsLogger import FlowsLogger
+
+# the input the action running in the current thread or task is handling
+CURRENT_INPUT = contextvars.ContextVar("current_input", default=None)
+
+
+class Tracer:
+    """
+    Tracer class
+    Sample the messages and record the spans of their traces
+    """
+
+    # singleton variables
+    _instance = None
+    _instance_lock = threading.Lock()
+    LOGGER = FlowsLogger.default_instance().get_logger()
+    CONFIG_MANAGER = ConfigManager.default_instance()
+
+    @classmethod
+    def default_instance(cls):
+        """
+        For use like a singleton, return the existing instance of the object
+        or a new instance
+        """
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = Tracer()
+
+        return cls._instance
+
+    def __init__(self):
+        super().__init__()
+        self.enabled = False
+        self.spans = None
+        self.trace_counter = itertools.count(1)
+        # unique among the nodes, on other hosts they may have the same pid
+        self.trace_prefix = uuid.uuid4().hex[:12]
+
+    def enable(self):
+        """
+        Start sampling the messages, according to the configuration
+        """
+        self.LOGGER.debug(
+            f"tracing {self.CONFIG_MANAGER.trace_sample_ratio:.2%} of the messages"
+        )
+        self.spans = collections.deque(maxlen=self.CONFIG_MANAGER.trace_buffer_size)
+        self.enabled = True
+
+    def trace_message(self, message):
+        """
+        Propagate the trace of the input being handled to a message
+        being sent, or start a new trace if the message is sampled
+        """
+        parent = CURRENT_INPUT.get()
+        if parent is not None:
+            if parent.trace_id is not None:
+                message.trace_id = parent.trace_id
+                message.hops = parent.hops + [(message.sender, time.time())]
+            return
+
+        if message.trace_id is None:
+            if random.random() < self.CONFIG_MANAGER.trace_sample_ratio:
+                message.trace_id = f"{self.trace_prefix}-{next(self.trace_counter):x}"
+                message.hops = [(message.sender, message.created)]
+
+    def record_span(self, action_name, action_input, duration):
+        """
+        Record the time spent by an action handling a traced input
+        """
+        end = time.time()
+        self.spans.append(
+            (
+                action_input.trace_id,
+                action_name,
+                action_input.sender,
+                list(action_input.hops),
+                end - duration,
+                duration,
+            )
+        )
+
+    def dump(self, filename=None, trace_format=None):
+        """
+        Write the recorded spans, as json or as chrome trace events
+        """
+        filename = filename or self.CONFIG_MANAGER.trace_file
+        trace_format = trace_format or self.CONFIG_MANAGER.trace_format
+        spans = list(self.spans or [])
+
+        if trace_format == "chrome":
+            document = self._chrome_trace_events(spans)
+        else:
+            document = self._traces(spans)
+
+        with open(filename, "w", encoding="utf-8") as trace_file:
+            json.dump(document, trace_file)
+
+        self.LOGGER.info(f"{len(spans)} spans written to {filename}")
+
+    @staticmethod
+    def _traces(spans):
+        """
+        Group the spans by trace
+        """
+        traces = {}
+        for trace_id, action, sender, hops, start, duration in spans:
+            trace = traces.setdefault(
+                trace_id,
+                {"trace_id": trace_id, "origin": hops[0][1], "end": 0, "spans": []},
+            )
+            trace["end"] = max(trace["end"], start + duration)
+            trace["spans"].append(
+                {
+                    "action": action,
+                    "sender": sender,
+                    "hops": hops,
+                    "start": start,
+                    "duration": duration,
+                    # time spent by the input in the queues
+                    "wait": start - hops[-1][1],
+                }
+            )
+
+        for trace in traces.values():
+            trace["elapsed"] = trace["end"] - trace["origin"]
+            trace["spans"].sort(key=lambda span: span["start"])
+
+        return {"traces": list(traces.values())}
+
+    @staticmethod
+    def _chrome_trace_events(spans):
+        """
+        Convert the spans to the chrome trace event format,
+        with a row for each action
+        """
+        pid = os.getpid()
+        thread_ids = {}
+        events = []
+        for trace_id, action, sender, hops, start, duration in spans:
+            if action not in thread_ids:
+                thread_ids[action] = len(thread_ids) + 1
+                events.append(
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": pid,
+                        "tid": thread_ids[action],
+                        "args": {"name": action},
+                    }
+                )
+
+            events.append(
+                {
+                    "name": action,
+                    "cat": "flows",
+                    "ph": "X",
+                    "ts": start * 1000000,
+                    "dur": duration * 1000000,
+                    "pid": pid,
+                    "tid": thread_ids[action],
+                    "args": {
+                        "trace_id": trace_id,
+                        "sender": sender,
+                        "wait_ms": (start - hops[-1][1]) * 1000,
+                        "elapsed_ms": (start + duration - hops[0][1]) * 1000,
+                    },
+                }
+            )
+
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
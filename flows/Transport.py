@@ -0,0 +1,351 @@
+"""
+Transport.py
+Pluggable transports used to move messages between the actions
+--------------------------------------------------------------
+
+Copyright 2016 Davide Mastromatteo
+License: Apache-2.0
+"""
+
+import collections
+import itertools
+import queue
+import sys
+import threading
+import time
+import uuid
+
+import zmq
+
+from flows.ConfigManager import ConfigManager
+from flows.FlowsLogger import FlowsLogger
+from flows.Metrics import MetricsRegistry
+from flows.WireFormat import WireFormat
+
+
+class Transport:
+    """
+    Transport class
+    Generic abstract class for a publish/subscribe messaging backend
+    """
+
+    name = ""
+    LOGGER = FlowsLogger.default_instance().get_logger()
+    CONFIG_MANAGER = ConfigManager.default_instance()
+
+    DROPPED_METRIC = MetricsRegistry.default_instance().counter(
+        "flows_transport_dropped_messages_total",
+        "Messages dropped because the queue of the transport was full",
+    )
+
+    def __init__(self):
+        super().__init__()
+        self.max_queue_length = self.CONFIG_MANAGER.transport_queue_size
+        self.dropped_messages = 0
+        self.DROPPED_METRIC.labels().set_function(lambda: self.dropped_messages)
+
+    def send(self, topic, message):
+        """
+        Publish a message on a topic, return False if nobody
+        is subscribed to that topic or if the message has been dropped
+        because the queue of the transport is full
+        """
+        raise NotImplementedError
+
+    def _count_dropped_message(self):
+        """
+        Keep track of the messages dropped because the queue was full
+        """
+        self.dropped_messages = self.dropped_messages + 1
+        if self.dropped_messages == 1:
+            self.LOGGER.warning(
+                f"the queue of the {self.name} transport is full, dropping messages"
+            )
+
+    def receive(self, max_messages=1):
+        """
+        Return a list of up to max_messages received messages,
+        0 means all the available ones
+        """
+        raise NotImplementedError
+
+    def has_messages(self):
+        """
+        Return True if there's something to receive
+        """
+        raise NotImplementedError
+
+    def subscribe(self, topic):
+        """
+        Receive the messages published with a topic starting with topic
+        """
+        raise NotImplementedError
+
+    def unsubscribe(self, topic):
+        """
+        Stop receiving the messages published with a topic
+        """
+        raise NotImplementedError
+
+    def publish_topics(self, topics):
+        """
+        Send the messages of these topics even if they are not subscribed
+        in this process, because other processes receive them.
+        None means all the topics
+        """
+        pass
+
+    def add_reader(self, loop, callback):
+        """
+        Invoke callback on the asyncio loop when new messages arrive
+        """
+        raise NotImplementedError
+
+    def remove_reader(self, loop):
+        """
+        Stop the notification of the new messages
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def create_transport(cls, transport_name):
+        """
+        Factory method to create an instance of a Transport from its name
+        """
+        cls.LOGGER.debug(f"creating transport {transport_name}")
+        for subclass in Transport.__subclasses__():
+            if subclass.name == transport_name:
+                return subclass()
+
+        raise ValueError(f"unknown transport {transport_name}")
+
+
+class InMemoryTransport(Transport):
+    """
+    InMemoryTransport class
+    Pass the messages by reference, for actions living in one process
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        super().__init__()
+
+        self.queue = collections.deque()
+        self.topics = set()
+        self.loop = None
+        self.callback = None
+        self.wakeup_pending = False
+
+    def send(self, topic, message):
+        if topic not in self.topics:
+            return False
+
+        # the producers never wait: the fetcher may be waiting for them
+        if len(self.queue) >= self.max_queue_length:
+            self._count_dropped_message()
+            return False
+
+        self.queue.append(message)
+
+        if self.loop is not None and not self.wakeup_pending:
+            self.wakeup_pending = True
+            self.loop.call_soon_threadsafe(self._wakeup)
+
+        return True
+
+    def receive(self, max_messages=1):
+        messages = []
+        try:
+            while max_messages <= 0 or len(messages) < max_messages:
+                messages.append(self.queue.popleft())
+        except IndexError:
+            pass
+
+        return messages
+
+    def has_messages(self):
+        return len(self.queue) > 0
+
+    def subscribe(self, topic):
+        self.topics.add(topic)
+
+    def unsubscribe(self, topic):
+        self.topics.discard(topic)
+
+    def add_reader(self, loop, callback):
+        self.callback = callback
+        self.loop = loop
+
+    def remove_reader(self, loop):
+        self.loop = None
+        self.callback = None
+
+    def _wakeup(self):
+        self.wakeup_pending = False
+        if self.callback is not None:
+            self.callback()
+
+
+class ZmqTransport(Transport):
+    """
+    ZmqTransport class
+    Serialize the messages and send them over 0mq.
+    zmq sockets are not thread safe, so the producers hand the encoded
+    messages over to a single sender thread that owns the PUB socket
+    """
+
+    name = "zmq"
+
+    DECODE_METRIC = MetricsRegistry.default_instance().histogram(
+        "flows_message_decode_seconds", "Time spent decoding a received message"
+    )
+
+    def __init__(self):
+        super().__init__()
+
+        self.wire_format = WireFormat.create_wire_format(
+            self.CONFIG_MANAGER.wire_format
+        )
+
+        self.context = zmq.Context()
+        self.publisher = self.context.socket(zmq.PUB)
+        self.subscriber = self.context.socket(zmq.SUB)
+
+        # don't drop the messages during a burst, up to the size of the
+        # queue of the memory transport
+        self.publisher.setsockopt(zmq.SNDHWM, self.max_queue_length)
+        self.subscriber.setsockopt(zmq.RCVHWM, self.max_queue_length)
+
+        if self.CONFIG_MANAGER.broker_frontend_address:
+            # worker process: the messages go through the broker
+            self.publisher.connect(self.CONFIG_MANAGER.broker_frontend_address)
+            self.subscriber.connect(self.CONFIG_MANAGER.broker_backend_address)
+        else:
+            self._bind_publisher()
+
+        self.topics = set()
+        # the topics subscribed by the other workers, and by anyone
+        self.remote_topics = set()
+        self.published_topics = set()
+
+        self.outbox = queue.SimpleQueue()
+        self.sender_thread = threading.Thread(target=self._send_outbox, daemon=True)
+        self.sender_thread.start()
+
+    def _bind_publisher(self):
+        """
+        Bind the publisher to the configured endpoint and connect the
+        subscriber to it. With a * port the system chooses a free one,
+        so there is nothing to retry
+        """
+        address = self.CONFIG_MANAGER.socket_address
+        try:
+            self.publisher.bind(address)
+        except zmq.error.ZMQError as error:
+            self.LOGGER.error(
+                f"can't bind the messaging subsystem to {address} ({error}). "
+                "The execution will be terminated"
+            )
+            sys.exit(8)
+
+        endpoint = self.publisher.getsockopt_string(zmq.LAST_ENDPOINT)
+        self.LOGGER.info(f"zmq subsystem on {endpoint}")
+        self.subscriber.connect(endpoint)
+
+    def send(self, topic, message):
+        # nobody would receive it, don't even encode it
+        if self.published_topics is not None and topic not in self.published_topics:
+            return False
+
+        if self.outbox.qsize() >= self.max_queue_length:
+            self._count_dropped_message()
+            return False
+
+        self.outbox.put([bytes(topic, "utf-8"), self.wire_format.encode(message)])
+        return True
+
+    def _send_outbox(self):
+        """
+        Publish the messages handed over by the producers
+        """
+        while True:
+            self.publisher.send_multipart(self.outbox.get())
+
+    def receive(self, max_messages=1):
+        raw_messages = []
+        try:
+            while max_messages <= 0 or len(raw_messages) < max_messages:
+                [_, msg] = self.subscriber.recv_multipart(flags=zmq.NOBLOCK)
+                raw_messages.append(msg)
+        except zmq.error.Again:
+            pass
+
+        decode_metric = self.DECODE_METRIC.labels()
+        messages = []
+        for msg in raw_messages:
+            # a late echo of the probes of wait_until_connected
+            if len(msg) == 0:
+                continue
+
+            start = time.perf_counter()
+            try:
+                messages.append(self.wire_format.decode(msg))
+            except (ValueError, TypeError) as error:
+                self.LOGGER.error(
+                    f"discarding a message that can't be decoded: {error}"
+                )
+            decode_metric.observe(time.perf_counter() - start)
+
+        return messages
+
+    def has_messages(self):
+        return bool(self.subscriber.getsockopt(zmq.EVENTS) & zmq.POLLIN)
+
+    def subscribe(self, topic):
+        self.topics.add(topic)
+        self._update_published_topics()
+        self.subscriber.setsockopt(zmq.SUBSCRIBE, bytes(topic, "utf-8"))
+
+    def unsubscribe(self, topic):
+        self.topics.discard(topic)
+        self._update_published_topics()
+        self.subscriber.setsockopt(zmq.UNSUBSCRIBE, bytes(topic, "utf-8"))
+
+    def publish_topics(self, topics):
+        self.remote_topics = None if topics is None else set(topics)
+        self._update_published_topics()
+
+    def _update_published_topics(self):
+        if self.remote_topics is None:
+            self.published_topics = None
+        else:
+            self.published_topics = self.topics | self.remote_topics
+
+    def wait_until_connected(self):
+        """
+        Wait for a message published by this process to come back through
+        the broker: then its subscriptions have reached the broker too
+        """
+        # unique among the nodes, on other hosts they may have the same pid
+        topic = bytes(f"*__flows_{uuid.uuid4().hex}__*", "utf-8")
+        self.subscriber.setsockopt(zmq.SUBSCRIBE, topic)
+        try:
+            for attempt in itertools.count(1):
+                self.outbox.put([topic, b""])
+                if not self.subscriber.poll(100):
+                    if attempt % 50 == 0:
+                        self.LOGGER.warning(
+                            "the broker is not answering, still waiting"
+                        )
+                    continue
+                if self.subscriber.recv_multipart()[0] == topic:
+                    return
+        finally:
+            self.subscriber.setsockopt(zmq.UNSUBSCRIBE, topic)
+
+    def add_reader(self, loop, callback):
+        loop.add_reader(self.subscriber.getsockopt(zmq.FD), callback)
+
+    def remove_reader(self, loop):
+        loop.remove_reader(self.subscriber.getsockopt(zmq.FD))
@@ -0,0 +1,237 @@
+"""
+WireFormat.py
+Serialization of the messages sent over the network transports
+--------------------------------------------------------------
+
+Every frame starts with the version of the wire format and with the tag
+of the serializer used to encode it. A receiver only decodes the frames
+of the serializer it is configured with, so a process that doesn't use
+pickle never unpickles a frame it receives.
+
+Copyright 2016 Davide Mastromatteo
+License: Apache-2.0
+"""
+
+import json
+import pickle
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from flows.FlowsLogger import FlowsLogger
+
+WIRE_FORMAT_VERSION = 1
+
+
+class FileSystemEvent:
+    """
+    Lightweight replacement for the watchdog events received over the wire
+    """
+
+    __slots__ = ("event_type", "src_path", "dest_path", "is_directory")
+
+    def __init__(self, event_type, src_path, dest_path, is_directory):
+        self.event_type = event_type
+        self.src_path = src_path
+        self.is_directory = is_directory
+
+        # only the move events have a destination
+        if dest_path is not None:
+            self.dest_path = dest_path
+
+
+class WireFormat:
+    """
+    WireFormat class
+    Generic abstract class for the serializers of ActionInput
+    """
+
+    name = ""
+    tag = b""
+    LOGGER = FlowsLogger.default_instance().get_logger()
+
+    _instances = {}
+
+    def __init__(self):
+        super().__init__()
+
+        # imported here, the actions module needs the transports to be loaded
+        from flows.Actions.Action import ActionInput
+
+        self.action_input_class = ActionInput
+
+    def dumps(self, action_input):
+        """
+        Serialize an ActionInput to bytes
+        """
+        raise NotImplementedError
+
+    def loads(self, payload):
+        """
+        Deserialize an ActionInput from bytes
+        """
+        raise NotImplementedError
+
+    def encode(self, action_input):
+        """
+        Return the frame for an ActionInput
+        """
+        try:
+            payload = self.dumps(action_input)
+        except (TypeError, ValueError) as error:
+            # the message can't be represented with this serializer
+            raise ValueError(
+                f"the message from {action_input.sender} can't be sent "
+                f"with the {self.name} wire format: {error}"
+            ) from error
+
+        return bytes((WIRE_FORMAT_VERSION,)) + self.tag + payload
+
+    def decode(self, frame):
+        """
+        Return the ActionInput contained in a frame, only if it was
+        encoded with this serializer
+        """
+        if frame[0] != WIRE_FORMAT_VERSION:
+            raise ValueError(f"unsupported wire format version {frame[0]}")
+
+        if frame[1:2] != self.tag:
+            raise ValueError(
+                f"frame encoded with the {frame[1:2]} wire format, "
+                f"expected {self.name}"
+            )
+
+        return self.loads(frame[2:])
+
+    @classmethod
+    def for_tag(cls, tag):
+        """
+        Return the serializer for a tag
+        """
+        if tag not in cls._instances:
+            for subclass in WireFormat.__subclasses__():
+                if subclass.tag == tag:
+                    cls._instances[tag] = subclass()
+                    break
+            else:
+                raise ValueError(f"unknown wire format {tag}")
+
+        return cls._instances[tag]
+
+    @classmethod
+    def create_wire_format(cls, wire_format_name):
+        """
+        Factory method to get the serializer from its name
+        """
+        cls.LOGGER.debug(f"creating wire format {wire_format_name}")
+        for subclass in WireFormat.__subclasses__():
+            if subclass.name == wire_format_name:
+                return cls.for_tag(subclass.tag)
+
+        raise ValueError(f"unknown wire format {wire_format_name}")
+
+    @staticmethod
+    def flatten(action_input):
+        """
+        Return the fields of an ActionInput as a plain list
+        """
+        event = action_input.file_system_event
+        if event is not None:
+            event = (
+                event.event_type,
+                event.src_path,
+                getattr(event, "dest_path", None),
+                event.is_directory,
+            )
+
+        fields = [
+            action_input.sender,
+            action_input.receiver,
+            action_input.message,
+            event,
+            action_input.created,
+        ]
+
+        # the trace is only sent for the sampled messages
+        if action_input.trace_id is not None:
+            fields.extend((action_input.trace_id, action_input.hops))
+
+        return fields
+
+    def unflatten(self, fields):
+        """
+        Build an ActionInput from the fields returned by flatten
+        """
+        sender, receiver, message, event, created, *trace = fields
+        if event is not None:
+            event = FileSystemEvent(*event)
+
+        trace_id, hops = trace or (None, None)
+        if hops is not None:
+            hops = [tuple(hop) for hop in hops]
+
+        return self.action_input_class(
+            event, message, sender, receiver, created, trace_id, hops
+        )
+
+
+class PickleWireFormat(WireFormat):
+    """
+    PickleWireFormat class
+    Pickle the ActionInput: only the fields in its __slots__, the
+    message can be any picklable object
+    """
+
+    name = "pickle"
+    tag = b"P"
+
+    def dumps(self, action_input):
+        return pickle.dumps(action_input, pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, payload):
+        return pickle.loads(payload)
+
+
+class CompactWireFormat(WireFormat):
+    """
+    CompactWireFormat class
+    Encode only sender, receiver, message, the file system event, the
+    creation time and the trace as JSON
+    """
+
+    name = "compact"
+    tag = b"J"
+
+    def __init__(self):
+        super().__init__()
+        self.encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    def dumps(self, action_input):
+        return self.encoder.encode(self.flatten(action_input)).encode("utf-8")
+
+    def loads(self, payload):
+        return self.unflatten(json.loads(payload))
+
+
+class MsgpackWireFormat(WireFormat):
+    """
+    MsgpackWireFormat class
+    Encode only sender, receiver, message, the file system event, the
+    creation time and the trace with msgpack, if it's installed
+    """
+
+    name = "msgpack"
+    tag = b"M"
+
+    def __init__(self):
+        super().__init__()
+        if msgpack is None:
+            raise ValueError("the msgpack wire format needs the msgpack package")
+
+    def dumps(self, action_input):
+        return msgpack.packb(self.flatten(action_input))
+
+    def loads(self, payload):
+        return self.unflatten(msgpack.unpackb(payload))
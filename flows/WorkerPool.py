@@ -0,0 +1,122 @@
+"""
+WorkerPool.py
+Shared pool of threads used to run the actions
+----------------------------------------------
+
+Copyright 2016 Davide Mastromatteo
+License: Apache-2.0
+"""
+
+import asyncio
+import queue
+import threading
+
+from flows.ConfigManager import ConfigManager
+from flows.FlowsLogger import FlowsLogger
+
+
+class WorkerPool:
+    """
+    WorkerPool class
+    Run the jobs of the actions on a bounded number of threads,
+    and their coroutines on an event loop.
+    The threads are daemon ones, like the threads of the actions used to
+    be, so a job that is still running doesn't delay the exit of flows
+    """
+
+    # singleton variables
+    _instance = None
+    _instance_lock = threading.Lock()
+    LOGGER = FlowsLogger.default_instance().get_logger()
+    CONFIG_MANAGER = ConfigManager.default_instance()
+
+    @classmethod
+    def default_instance(cls):
+        """
+        For use like a singleton, return the existing instance of the object
+        or a new instance
+        """
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = WorkerPool()
+
+        return cls._instance
+
+    def __init__(self):
+        super().__init__()
+        self.jobs = queue.SimpleQueue()
+        self.threads = None
+        self.is_shut_down = False
+        self.event_loop = None
+
+    def submit(self, job, *args):
+        """
+        Run a job on the pool, the pool is created on first use so
+        it's sized according to the command line arguments
+        """
+        if self.threads is None:
+            with self._instance_lock:
+                if self.threads is None:
+                    pool_size = self.CONFIG_MANAGER.worker_pool_size
+                    self.LOGGER.debug(f"starting a worker pool of {pool_size} threads")
+                    threads = [
+                        threading.Thread(
+                            target=self._run_jobs,
+                            name=f"flows-worker_{index}",
+                            daemon=True,
+                        )
+                        for index in range(pool_size)
+                    ]
+                    for thread in threads:
+                        thread.start()
+                    self.threads = threads
+
+        if not self.is_shut_down:
+            self.jobs.put((job, args))
+
+    def _run_jobs(self):
+        while True:
+            job, args = self.jobs.get()
+            if job is None:
+                return
+
+            try:
+                job(*args)
+            except Exception as exc:
+                self.LOGGER.error(
+                    f"error while running a job of the worker pool: {str(exc)}"
+                )
+
+    def shutdown(self):
+        """
+        Drop the jobs waiting for a thread and stop the threads as soon as
+        their running jobs are done, without waiting for them
+        """
+        self.is_shut_down = True
+        try:
+            while True:
+                self.jobs.get_nowait()
+        except queue.Empty:
+            pass
+
+        for _ in self.threads or []:
+            self.jobs.put((None, None))
+
+    def submit_coroutine(self, coroutine):
+        """
+        Run a coroutine on the event loop of the pool.
+        The loop has its own thread, so the coroutines never slow down
+        the message fetcher
+        """
+        if self.event_loop is None:
+            with self._instance_lock:
+                if self.event_loop is None:
+                    self.LOGGER.debug("starting the event loop of the worker pool")
+                    event_loop = asyncio.new_event_loop()
+                    threading.Thread(
+                        target=event_loop.run_forever, name="flows-async", daemon=True
+                    ).start()
+                    self.event_loop = event_loop
+
+        return asyncio.run_coroutine_threadsafe(coroutine, self.event_loop)